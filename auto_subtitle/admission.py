@@ -0,0 +1,183 @@
+import math
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from .metrics import ADMITTED_JOBS, REJECTED_REQUESTS
+
+
+# Encode time assumed for Retry-After until the first encode has finished (seconds)
+DEFAULT_ENCODE_SECONDS = 30.0
+
+# Weight of the newest encode in the running average encode time
+ENCODE_SECONDS_WEIGHT = 0.2
+
+MAX_RETRY_AFTER = 3600
+
+
+def memory_available() -> Optional[int]:
+    """Bytes of memory available to new work (MemAvailable on Linux), or None where it is not known."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class AdmissionController:
+    """
+    Decides whether the server takes on more work.
+
+    A job is admitted from the moment its request arrives until its encode is
+    done, whether it runs in the request or in the background. At most
+    `workers` encodes run at once (the encode pool) and `max_queued` more may
+    wait, so requests beyond workers + max_queued are turned away, as are
+    requests that would leave less than min_free_disk bytes on any of
+    disk_paths (where uploads and outputs go) or min_free_memory bytes of memory.
+    """
+
+    def __init__(self, workers: int, max_queued: int, disk_paths: List[Path], min_free_disk: int,
+                 min_free_memory: int):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.disk_paths = disk_paths
+        self.min_free_disk = min_free_disk
+        self.min_free_memory = min_free_memory
+        self.encode_seconds = None
+
+    @property
+    def admitted(self) -> int:
+        return int(ADMITTED_JOBS.get())
+
+    @contextmanager
+    def track(self):
+        """Count the block as an admitted job while it runs."""
+        with ADMITTED_JOBS.track():
+            yield
+
+    async def hold(self, job):
+        """Run a background job coroutine as an admitted job."""
+        with self.track():
+            return await job
+
+    def record_encode(self, seconds: float):
+        """Fold a finished encode into the average encode time used for Retry-After."""
+        if self.encode_seconds is None:
+            self.encode_seconds = seconds
+        else:
+            self.encode_seconds += ENCODE_SECONDS_WEIGHT * (seconds - self.encode_seconds)
+
+    def retry_after(self) -> int:
+        """Seconds until an encode worker is likely free for one more job, from the backlog and recent encode times."""
+        ahead = max(1, self.admitted - self.workers + 1)
+        seconds = ahead * (self.encode_seconds or DEFAULT_ENCODE_SECONDS) / self.workers
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(seconds)))
+
+    def check(self, upload_size: int = 0, encodes: bool = True) -> Optional[Tuple[int, str, str]]:
+        """
+        (status, detail, reason) if a request should be turned away, None if
+        it can be admitted. upload_size is the size of the request body, which
+        will be written to disk. Capacity only counts for requests that encode.
+        """
+        if encodes and self.admitted >= self.workers + self.max_queued:
+            return 429, (f"Server is busy: {self.admitted} jobs are encoding or queued "
+                         f"(limit {self.workers + self.max_queued})"), "capacity"
+
+        if self.min_free_disk:
+            for path in self.disk_paths:
+                if path.exists() and shutil.disk_usage(path).free - upload_size < self.min_free_disk:
+                    return 503, "Not enough free disk space to accept this request", "disk"
+
+        if self.min_free_memory:
+            available = memory_available()
+            if available is not None and available < self.min_free_memory:
+                return 503, "Not enough free memory to accept this request", "memory"
+
+        return None
+
+
+def body_too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Request body exceeds the maximum size of {limit // (1024 * 1024)} MB"
+    )
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to the POST endpoints in
+    `paths` before their body is read, so a rejected upload is not received
+    first. `paths` maps each path to whether its requests encode (and so count
+    against capacity) or only need disk and memory headroom.
+    Rejections get a JSON error and a Retry-After header.
+
+    `body_limits` caps the request body of paths in bytes: a larger
+    Content-Length is answered with 413 straight away, and a body without one
+    is cut off with 413 once it grows past the limit.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: Dict[str, bool],
+                 body_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.controller = controller
+        self.paths = paths
+        self.body_limits = body_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        encodes = self.paths[scope["path"]]
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length", b"0")
+        upload_size = int(content_length) if content_length.isdigit() else 0
+
+        limit = self.body_limits.get(scope["path"], 0)
+        if limit:
+            if upload_size > limit:
+                REJECTED_REQUESTS.inc(reason="size")
+                error = body_too_large(limit)
+                await JSONResponse({"detail": error.detail}, status_code=error.status_code)(scope, receive, send)
+                return
+            receive = self.limit_body(receive, limit)
+
+        rejection = self.controller.check(upload_size, encodes)
+        if rejection is not None:
+            status, detail, reason = rejection
+            REJECTED_REQUESTS.inc(reason=reason)
+            response = JSONResponse(
+                {"detail": detail}, status_code=status, headers={"Retry-After": str(self.controller.retry_after())}
+            )
+            await response(scope, receive, send)
+            return
+
+        if not encodes:
+            await self.app(scope, receive, send)
+            return
+        with self.controller.track():
+            await self.app(scope, receive, send)
+
+    @staticmethod
+    def limit_body(receive, limit: int):
+        """
+        Wrap receive to stop a body at limit bytes. The HTTPException raised
+        while the form is parsed becomes the 413 response.
+        """
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    REJECTED_REQUESTS.inc(reason="size")
+                    raise body_too_large(limit)
+            return message
+
+        return receive_limited
@@ -1,15 +1,39 @@
 import os
 import ffmpeg
+import asyncio
+import hashlib
+import socket
 import tempfile
 import shutil
+import io
+import json
 import httpx
+import threading
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from typing import Callable, List, Optional
 import uuid
+import functools
 from pathlib import Path
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 import time
+from .burn_srt import burn, burn_batch, render_key, file_digest, subtitle_language, DEFAULT_STYLE, MODES
+from .audio import load_audio
+from .model_pool import ModelPool
+from .transcript_cache import transcript_key, load_transcript, save_transcript
+from .utils import write_srt, srt_cue, json_default, str2bool
+from .subtitles import SubtitleError, load_subtitles, write_vtt
+from .encoding import PROFILES
+from .ingest import GrowingFile, HEAD_BYTES, streamable
+from .downloads import file_response, output_etag
+from .admission import AdmissionController, AdmissionMiddleware
+from .store import JobStore, open_store
+from .metrics import (
+    CONTENT_TYPE, RequestMetricsMiddleware, render_metrics, STAGE_SECONDS, INPUT_BYTES, OUTPUT_BYTES, REALTIME_FACTOR,
+    ENCODE_QUEUE, ENCODES_RUNNING, TRANSCRIPTIONS_RUNNING
+)
 
 app = FastAPI(
     title="Subtitle Burner API",
@@ -17,7 +41,123 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Add CORS middleware
+# Create temp directory for processing
+TEMP_DIR = Path(tempfile.gettempdir()) / "subtitle_api"
+TEMP_DIR.mkdir(exist_ok=True)
+
+# Each worker process (uvicorn --workers N, or one per replica) keeps its job
+# directories under its own WORK_DIR, so workers never clean up each other's inputs.
+# The random part tells a restarted container apart from the worker it replaces,
+# which usually had the same hostname and PID.
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+WORK_DIR = TEMP_DIR / f"worker-{WORKER_ID}"
+
+# Create output directory for downloadable files. Set OUTPUT_DIR to a
+# persistent volume to keep outputs and download links across restarts.
+OUTPUT_DIR = Path(os.environ.get("OUTPUT_DIR", TEMP_DIR / "outputs"))
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+# How long jobs and their download links stay valid, unless a request asks otherwise
+OUTPUT_TTL = float(os.environ.get("OUTPUT_TTL_HOURS", 24)) * 3600
+
+# Disk budget for OUTPUT_DIR, least recently downloaded outputs are evicted beyond it.
+# 0 means unlimited.
+OUTPUT_DISK_BUDGET = int(os.environ.get("OUTPUT_DISK_BUDGET_MB", 10240)) * 1024 * 1024
+
+# How often the reaper removes expired jobs and enforces the disk budget.
+# Workers also send their heartbeat at this interval; a worker that misses
+# three heartbeats is considered gone and its unfinished jobs are failed.
+REAPER_INTERVAL = float(os.environ.get("REAPER_INTERVAL_SECONDS", 60))
+WORKER_STALE_AFTER = REAPER_INTERVAL * 3
+
+# Jobs and outputs (which double as the render cache) are kept in a store shared
+# by all workers, so download links survive a restart and work on any worker.
+# JOB_STORE is a bare SQLite path or a URL such as sqlite:////data/registry.db.
+# Job status is one of: queued, running, done, failed
+JOB_STORE = os.environ.get("JOB_STORE", str(OUTPUT_DIR / "registry.db"))
+store: JobStore = open_store(
+    JOB_STORE, OUTPUT_DIR,
+    max_bytes=OUTPUT_DISK_BUDGET, ttl=OUTPUT_TTL, worker_id=WORKER_ID
+)
+
+# Inputs are copied to disk in fixed-size chunks so memory use stays flat
+CHUNK_SIZE = 1024 * 1024
+
+# Largest accepted input in bytes (uploads and URL downloads), 0 means unlimited
+MAX_INPUT_SIZE = int(os.environ.get("MAX_INPUT_SIZE_MB", 0)) * 1024 * 1024
+
+# Room for the form fields and multipart headers of a request, on top of its files
+FORM_OVERHEAD = 1024 * 1024
+
+# Shared HTTP client for URL inputs, created on startup. Reusing it keeps
+# connections alive between requests instead of paying a new TCP/TLS handshake
+# for every download.
+http_client: Optional[httpx.AsyncClient] = None
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+VIDEO_DOWNLOAD_TIMEOUT = 300.0
+SRT_DOWNLOAD_TIMEOUT = 60.0
+
+# Start encoding a video_url while it is still downloading, when its
+# container can be read front to back (fragmented MP4, MKV/WebM, MPEG-TS)
+STREAM_INPUTS = str2bool(os.environ.get("STREAM_INPUTS", "true"))
+
+# Chunks of a streamed output (see progress.OUTPUT_CHUNK_SIZE) held for a
+# client that reads slower than ffmpeg writes, before ffmpeg is made to wait
+STREAM_BUFFER_CHUNKS = 16
+
+# Keep references to running background tasks so they are not garbage collected
+background_tasks = set()
+
+# Encodes run in a bounded worker pool so ffmpeg never blocks the event loop.
+# Each worker only waits on an ffmpeg subprocess, so threads are enough.
+ENCODE_WORKERS = int(os.environ.get("ENCODE_WORKERS", os.cpu_count() or 1))
+encode_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="ffmpeg")
+
+# Most subtitle files one /burn-subtitles/batch request may render; burned
+# variants are all encoded by the same ffmpeg process
+MAX_BATCH_SUBTITLES = int(os.environ.get("MAX_BATCH_SUBTITLES", 16))
+
+
+def max_body_size(files: int) -> int:
+    """Largest request body with this many file fields of at most MAX_INPUT_SIZE each, 0 for unlimited."""
+    return MAX_INPUT_SIZE * files + FORM_OVERHEAD if MAX_INPUT_SIZE else 0
+
+
+# Admission control: jobs beyond ENCODE_WORKERS running and MAX_QUEUED_JOBS
+# waiting are turned away with 429, and uploads that would leave less than
+# MIN_FREE_DISK_MB of disk or MIN_FREE_MEMORY_MB of memory with 503, both
+# with a Retry-After estimated from the backlog and recent encode times
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", ENCODE_WORKERS * 4))
+MIN_FREE_DISK = int(os.environ.get("MIN_FREE_DISK_MB", 1024)) * 1024 * 1024
+MIN_FREE_MEMORY = int(os.environ.get("MIN_FREE_MEMORY_MB", 256)) * 1024 * 1024
+admission = AdmissionController(
+    ENCODE_WORKERS, MAX_QUEUED_JOBS, [TEMP_DIR, OUTPUT_DIR], MIN_FREE_DISK, MIN_FREE_MEMORY
+)
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    # Whether requests to each path encode (and count against capacity) or only transcribe
+    paths={
+        "/burn-subtitles": True,
+        "/burn-subtitles/batch": True,
+        "/burn-subtitles-url": True,
+        "/auto-subtitle": True,
+        "/transcribe": False,
+        "/transcribe/stream": False,
+    },
+    # Uploads are parsed to disk before an endpoint runs, so oversized
+    # bodies are turned away here, before they are received
+    body_limits={
+        "/burn-subtitles": max_body_size(2),
+        "/burn-subtitles/batch": max_body_size(1 + MAX_BATCH_SUBTITLES),
+        "/burn-subtitles-url": max_body_size(0),
+        "/auto-subtitle": max_body_size(1),
+        "/transcribe": max_body_size(1),
+        "/transcribe/stream": max_body_size(1),
+    }
+)
+
+# Add CORS middleware (after admission control, so rejections carry its headers)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,16 +166,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create temp directory for processing
-TEMP_DIR = Path(tempfile.gettempdir()) / "subtitle_api"
-TEMP_DIR.mkdir(exist_ok=True)
+# Time every request and count response bytes for GET /metrics
+app.add_middleware(RequestMetricsMiddleware)
 
-# Create output directory for downloadable files
-OUTPUT_DIR = TEMP_DIR / "outputs"
-OUTPUT_DIR.mkdir(exist_ok=True)
+# Encoding profile used when a request does not pick one, and the encoder
+# thread count per ffmpeg process (0 lets x264 decide)
+ENCODING_PROFILE = os.environ.get("ENCODING_PROFILE", "balanced")
+ENCODE_THREADS = int(os.environ.get("ENCODE_THREADS", 0))
 
-# Store file metadata (job_id -> {filename, created_at, path})
-file_registry = {}
+# Upper bound for the `parallel` form field (ffmpeg processes used by one segmented encode)
+MAX_PARALLEL = int(os.environ.get("MAX_PARALLEL", os.cpu_count() or 1))
+
+# Whisper models for /transcribe and /auto-subtitle, loaded once at startup so
+# requests never wait for a model to load. Each model is loaded WHISPER_REPLICAS
+# times, which caps how many transcriptions of it run at once. The first model
+# is the default; an empty list (or no whisper install) disables transcription.
+WHISPER_MODELS = [name.strip() for name in os.environ.get("WHISPER_MODELS", "small").split(",") if name.strip()]
+WHISPER_REPLICAS = int(os.environ.get("WHISPER_REPLICAS", 1))
+model_pool = ModelPool(WHISPER_MODELS, WHISPER_REPLICAS)
+
+# Transcriptions are cached by audio and decode options (see transcript_cache),
+# next to the outputs so every worker shares them
+TRANSCRIPT_DIR = OUTPUT_DIR / "transcripts"
+TRANSCRIPT_CACHE_BUDGET = int(os.environ.get("TRANSCRIPT_CACHE_MB", 512)) * 1024 * 1024
 
 
 @app.get("/")
@@ -44,9 +197,16 @@ async def root():
         "message": "Subtitle Burner API",
         "version": "2.0.0",
         "endpoints": {
-            "POST /burn-subtitles": "Upload files OR provide URLs. Returns download URL (file stored until server restart)",
+            "POST /burn-subtitles": "Upload files OR provide URLs. Returns download URL (file kept for OUTPUT_TTL_HOURS)",
+            "POST /burn-subtitles/batch": "One video plus several subtitle files (e.g. one per language), rendered in a single ffmpeg run",
             "POST /burn-subtitles-url": "Legacy URL-only endpoint (deprecated, use /burn-subtitles instead)",
+            "POST /transcribe": "Transcribe a video with Whisper. Returns SRT or JSON",
+            "POST /transcribe/stream": "Transcribe a video, streaming cues as Server-Sent Events while it runs",
+            "POST /auto-subtitle": "Transcribe a video and burn the subtitles in. Returns download URL",
+            "GET /jobs/{job_id}": "Get the status of a background job (queued, running, done, failed)",
             "GET /download/{job_id}": "Download a processed video by job ID",
+            "GET /cache": "Output cache statistics (hits, misses, size, evictions)",
+            "GET /metrics": "Prometheus metrics (stage latencies, bytes, queue depth, ffmpeg CPU and memory)",
             "GET /health": "Health check endpoint"
         }
     }
@@ -57,6 +217,811 @@ async def health_check():
     return {"status": "healthy"}
 
 
+def render_options(style: str, parallel: int, smart: bool, profile: Optional[str],
+                   mode: str = "burn") -> dict:
+    """Validate render form fields and turn them into burn() keyword arguments."""
+    if mode not in MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown mode '{mode}'. Expected one of: {', '.join(MODES)}"
+        )
+
+    profile = profile or ENCODING_PROFILE
+    if profile not in PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown profile '{profile}'. Expected one of: {', '.join(PROFILES)}"
+        )
+
+    return {
+        "style": style,
+        "parallel": min(parallel, MAX_PARALLEL),
+        "smart": smart,
+        "profile": profile,
+        "threads": ENCODE_THREADS or None,
+        "mode": mode
+    }
+
+
+def transcription_options(model: Optional[str], task: str, language: Optional[str]) -> tuple:
+    """Validate transcription form fields. Returns the model name and transcribe() options."""
+    if not WHISPER_MODELS or not model_pool.idle:
+        raise HTTPException(status_code=503, detail="Transcription is not enabled on this server")
+
+    model = model or WHISPER_MODELS[0]
+    if model not in model_pool:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model '{model}' is not loaded. Expected one of: {', '.join(WHISPER_MODELS)}"
+        )
+    if task not in ("transcribe", "translate"):
+        raise HTTPException(status_code=400, detail="Task must be 'transcribe' or 'translate'")
+
+    # Same option layout as the CLI, so both share transcript cache entries
+    options = {"task": task}
+    if model.endswith(".en"):
+        options["language"] = "en"
+    elif language and language != "auto":
+        options["language"] = language
+    return model, options
+
+
+def check_input_size(size: int):
+    """Abort with 413 once an input grows past MAX_INPUT_SIZE."""
+    if MAX_INPUT_SIZE and size > MAX_INPUT_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Input file exceeds the maximum size of {MAX_INPUT_SIZE // (1024 * 1024)} MB"
+        )
+
+
+async def save_upload(upload: UploadFile, dest: Path) -> str:
+    """
+    Stream an uploaded file to dest chunk by chunk. Returns its SHA-256.
+    The upload has already been spooled to disk while the form was parsed;
+    oversized request bodies are rejected before that (see AdmissionMiddleware).
+    """
+    h = hashlib.sha256()
+    size = 0
+    writing = 0.0
+    with STAGE_SECONDS.time(stage="upload"), open(dest, "wb") as f:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            check_input_size(size)
+            h.update(chunk)
+            started = time.perf_counter()
+            f.write(chunk)
+            writing += time.perf_counter() - started
+
+    STAGE_SECONDS.observe(writing, stage="disk_write")
+    INPUT_BYTES.inc(size, source="upload")
+    return h.hexdigest()
+
+
+def source_key(url: str, headers) -> Optional[str]:
+    """
+    Identity of a remote file's content: its URL and a strong ETag, or else its
+    Last-Modified date. None when the server sends neither.
+    """
+    etag = headers.get("etag")
+    validator = etag if etag and not etag.startswith("W/") else headers.get("last-modified")
+    if not validator:
+        return None
+    return hashlib.sha256(f"{url}\0{validator}".encode("utf-8")).hexdigest()
+
+
+async def download_file_to(url: str, dest: Path, timeout: float = VIDEO_DOWNLOAD_TIMEOUT,
+                           on_write: Optional[Callable] = None, on_response: Optional[Callable] = None) -> str:
+    """
+    Stream a remote file to dest chunk by chunk. Returns its SHA-256.
+    on_response(headers) is called once the response headers are in.
+    on_write(size, total) is called with the bytes written so far after every
+    chunk, once they can be read from dest, and the size the server announced
+    (None without a Content-Length).
+    """
+    h = hashlib.sha256()
+    size = 0
+    writing = 0.0
+    with STAGE_SECONDS.time(stage="download"):
+        async with http_client.stream("GET", url, timeout=timeout) as response:
+            response.raise_for_status()
+            if on_response is not None:
+                on_response(response.headers)
+
+            # Fail fast when the server announces a file that is too large
+            content_length = response.headers.get("content-length")
+            total = None
+            if content_length and content_length.isdigit():
+                total = int(content_length)
+                check_input_size(total)
+
+            with open(dest, "wb") as f:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    size += len(chunk)
+                    check_input_size(size)
+                    h.update(chunk)
+                    started = time.perf_counter()
+                    f.write(chunk)
+                    if on_write is not None:
+                        f.flush()
+                    writing += time.perf_counter() - started
+                    if on_write is not None:
+                        on_write(size, total)
+
+    STAGE_SECONDS.observe(writing, stage="disk_write")
+    INPUT_BYTES.inc(size, source="url")
+    return h.hexdigest()
+
+
+def video_input_path(video: Optional[UploadFile], video_url: Optional[str], job_dir: Path) -> Path:
+    """Where a job keeps its video: named after the upload's or the URL path's extension (default .mp4)."""
+    name = video.filename if video else urlsplit(video_url).path.rsplit("/", 1)[-1]
+    return job_dir / f"input{Path(name or '').suffix or '.mp4'}"
+
+
+async def fetch_video_input(video: Optional[UploadFile], video_url: Optional[str], job_dir: Path) -> tuple:
+    """Save the uploaded video or download video_url into job_dir. Returns (path, SHA-256)."""
+    video_path = video_input_path(video, video_url, job_dir)
+    if video:
+        return video_path, await save_upload(video, video_path)
+    print(f"Downloading video from {video_url}...")
+    return video_path, await download_file_to(video_url, video_path, timeout=VIDEO_DOWNLOAD_TIMEOUT)
+
+
+def request_error(e: Exception, job_dir: Path) -> HTTPException:
+    """Remove the job directory of a request that failed and return the HTTP error to answer with."""
+    shutil.rmtree(job_dir, ignore_errors=True)
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, httpx.HTTPError):
+        return HTTPException(status_code=400, detail=f"Failed to download file from URL: {str(e)}")
+    if isinstance(e, ffmpeg.Error):
+        # An encode that ran while the video was downloading
+        error_msg = e.stderr.decode() if e.stderr else str(e)
+        return HTTPException(status_code=500, detail=f"FFmpeg processing failed: {error_msg}")
+    return HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+async def check_subtitles(srt_path: Path):
+    """Parse and validate a subtitle file before any encode is queued. Aborts with 400 if it is invalid."""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, load_subtitles, str(srt_path))
+    except SubtitleError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid subtitle file: {str(e)}")
+
+
+async def run_store(method, *args, **kwargs):
+    """
+    Call a JobStore method on the default executor. The SQLite store can wait
+    up to its busy timeout for a lock, which must not stall the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+
+async def gather_or_cancel(*aws):
+    """
+    Like asyncio.gather, but cancels the remaining awaitables as soon as one fails
+    so no transfer keeps writing into a job directory that is being cleaned up.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def encode_job(job_id: str, video_path: Path, srt_path: Path, output_path: Path, options: dict,
+               submitted: float, growing: Optional[GrowingFile] = None, on_output: Optional[Callable] = None):
+    """
+    Run one encode inside the worker pool, tracking its state in the store.
+    With growing, the video is read while it downloads (see fetch_inputs).
+    With on_output, the video is streamed to it (see burn()) and written to output_path as well.
+    """
+    ENCODE_QUEUE.dec()
+    STAGE_SECONDS.observe(time.perf_counter() - submitted, stage="queue")
+    store.update_job(job_id, status="running", started_at=time.time())
+
+    progress = {}
+
+    def report(info: dict):
+        progress.update(info)
+        store.update_job(job_id, progress=json.dumps(info))
+
+    tee = open(output_path, "wb") if on_output is not None else None
+
+    def send(chunk: bytes):
+        tee.write(chunk)
+        on_output(chunk)
+
+    # Use absolute paths - ffmpeg on Windows needs proper path format
+    started = time.perf_counter()
+    with ENCODES_RUNNING.track(), STAGE_SECONDS.time(stage="encode"):
+        try:
+            burn(
+                str(video_path.absolute()),
+                str(srt_path.absolute()),
+                str(output_path.absolute()),
+                progress=report,
+                feed=growing.feed if growing else None,
+                fed=growing.fraction if growing else None,
+                on_output=send if tee else None,
+                **options
+            )
+        finally:
+            if tee is not None:
+                tee.close()
+
+    # Encodes that wait on a download or a client do not show the encoder's pace
+    if growing is None and on_output is None:
+        admission.record_encode(time.perf_counter() - started)
+
+    # The final report carries the average speed of the whole encode
+    REALTIME_FACTOR.observe(progress.get("speed", 0.0), mode=options["mode"])
+    OUTPUT_BYTES.inc(output_path.stat().st_size, mode=options["mode"])
+
+
+async def run_encode(job_id: str, video_path: Path, srt_path: Path, output_path: Path, options: dict,
+                     growing: Optional[GrowingFile] = None, on_output: Optional[Callable] = None):
+    """Wait for an encode on the worker pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    ENCODE_QUEUE.inc()
+    await loop.run_in_executor(
+        encode_pool, encode_job, job_id, video_path, srt_path, output_path, options, time.perf_counter(),
+        growing, on_output
+    )
+
+
+async def render_cached(job_id: str, key: str, video_path: Path, srt_path: Path, options: dict) -> Path:
+    """
+    Return the output for a render key, encoding it only on a cache miss.
+    Outputs are content-addressed as OUTPUT_DIR/<key>.mp4.
+    """
+    output_path = await run_store(store.get_output, key)
+    if output_path is not None:
+        print(f"Cache hit for job {job_id}, skipping encode")
+        return output_path
+
+    # Ensure OUTPUT_DIR exists (in case it was deleted)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Encode next to the final path and rename, so concurrent identical jobs
+    # never write the same file and readers never see a partial output
+    output_path = store.output_path(key)
+    partial_path = OUTPUT_DIR / f"{key}.{job_id}.part.mp4"
+    try:
+        await run_encode(job_id, video_path, srt_path, partial_path, options)
+        os.replace(partial_path, output_path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+    await run_store(store.add_output, key, output_path)
+    return output_path
+
+
+async def fetch_inputs(video_url: str, video_path: Path, srt_path: Path, fetch_srt, options: dict) -> tuple:
+    """
+    Start downloading video_url, fetch the SRT with the fetch_srt coroutine and
+    validate it. Returns (download task, SRT digest, growing file).
+
+    When the video can be read from a pipe (see ingest.streamable), the
+    growing file is passed to burn() so the encode reads the video while it
+    downloads; the task then resolves to the video digest once the download
+    is done. Otherwise it is None and the download has already finished.
+
+    The digest of every download is recorded under the video's source_key.
+    When the same version of the video comes up again and its render is
+    already cached, the download is stopped and the task resolves to the
+    recorded digest right away (with None for the growing file), so the
+    caller finds the render in the cache.
+    """
+    growing = GrowingFile(str(video_path))
+    head = asyncio.Event()
+    source = {}
+
+    def on_response(headers):
+        source["key"] = source_key(video_url, headers)
+
+    def on_write(size: int, total: Optional[int]):
+        growing.expected = total
+        growing.grow(size)
+        if size >= HEAD_BYTES:
+            head.set()
+
+    async def fetch_video():
+        print(f"Downloading video from {video_url}...")
+        try:
+            digest = await download_file_to(video_url, video_path, VIDEO_DOWNLOAD_TIMEOUT, on_write, on_response)
+        finally:
+            growing.finish()
+            head.set()
+        if source.get("key"):
+            await run_store(store.add_source_digest, source["key"], digest)
+        return digest
+
+    download = asyncio.ensure_future(fetch_video())
+    try:
+        srt_digest = await fetch_srt
+        await check_subtitles(srt_path)
+
+        await head.wait()
+        if not download.done() and source.get("key"):
+            digest = await run_store(store.get_source_digest, source["key"])
+            key = digest and render_key(digest, srt_digest, options["style"], options["profile"], options["mode"])
+            if key and await run_store(store.has_output, key):
+                print(f"Already rendered {video_url}, skipping its download")
+                await cancel_download(download)
+                cached = asyncio.get_running_loop().create_future()
+                cached.set_result(digest)
+                return cached, srt_digest, None
+
+        # Segmented and smart renders seek around the whole file
+        if not download.done() and STREAM_INPUTS and options["parallel"] == 1 and not options["smart"]:
+            with open(video_path, "rb") as f:
+                if streamable(f.read(HEAD_BYTES)):
+                    return download, srt_digest, growing
+
+        await download
+        return download, srt_digest, None
+
+    except BaseException:
+        await cancel_download(download)
+        raise
+
+
+async def cancel_download(download: asyncio.Future):
+    if not download.done():
+        download.cancel()
+        await asyncio.gather(download, return_exceptions=True)
+
+
+def file_output(partial_path: Path, key: str):
+    """Move a finished encode into the cache under its render key, unless an identical one got there first."""
+    if not store.has_output(key):
+        os.replace(partial_path, store.output_path(key))
+        store.add_output(key, store.output_path(key))
+
+
+async def fetch_and_encode(job_id: str, video_url: str, video_path: Path, srt_path: Path, fetch_srt,
+                           style: str, options: dict) -> tuple:
+    """
+    Download video_url while the SRT is fetched by the fetch_srt coroutine and
+    validated, and return both digests.
+
+    When the video can be read from a pipe, the encode starts as soon as the
+    SRT is valid, so download and encode overlap (see fetch_inputs). Its output
+    is then in the cache under the render key, where render_cached() finds it.
+    Other videos (e.g. MP4 with the moov atom at the end) are downloaded in
+    full and encoded afterwards.
+    """
+    download, srt_digest, growing = await fetch_inputs(video_url, video_path, srt_path, fetch_srt, options)
+    if growing is None:
+        return download.result(), srt_digest
+
+    # Ensure OUTPUT_DIR exists (in case it was deleted)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    print(f"Encoding job {job_id} while its video downloads")
+    partial_path = OUTPUT_DIR / f"{job_id}.part.mp4"
+    try:
+        _, video_digest = await gather_or_cancel(
+            run_encode(job_id, video_path, srt_path, partial_path, options, growing), download
+        )
+        await run_store(
+            file_output, partial_path, render_key(video_digest, srt_digest, style, options["profile"], options["mode"])
+        )
+    finally:
+        partial_path.unlink(missing_ok=True)
+        await cancel_download(download)
+    return video_digest, srt_digest
+
+
+async def stream_render(job_id: str, job_dir: Path, download: asyncio.Future, srt_digest: str, video_path: Path,
+                        srt_path: Path, style: str, options: dict, growing: Optional[GrowingFile] = None):
+    """
+    Encode a job as fragmented MP4 and yield the video as ffmpeg writes it.
+    The output is also written to OUTPUT_DIR and filed in the cache under its
+    render key once both the encode and the video download are complete.
+    A client that goes away stops the encode. Cleans up job_dir when done.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(maxsize=STREAM_BUFFER_CHUNKS)
+    closed = threading.Event()
+
+    def on_output(chunk: bytes):
+        # Runs on ffmpeg's output thread; waits while the client is STREAM_BUFFER_CHUNKS behind
+        if closed.is_set():
+            raise ConnectionError("Client disconnected")
+        asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+    # Ensure OUTPUT_DIR exists (in case it was deleted)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    partial_path = OUTPUT_DIR / f"{job_id}.part.mp4"
+    encode = asyncio.ensure_future(
+        run_encode(job_id, video_path, srt_path, partial_path, options, growing, on_output)
+    )
+    chunk = None
+    try:
+        while True:
+            chunk = asyncio.ensure_future(chunks.get())
+            await asyncio.wait([chunk, encode], return_when=asyncio.FIRST_COMPLETED)
+            if chunk.done():
+                yield chunk.result()
+                continue
+
+            # Every chunk is queued before the encode returns
+            chunk.cancel()
+            while not chunks.empty():
+                yield chunks.get_nowait()
+            break
+
+        encode.result()
+        video_digest = await download
+        await run_store(
+            file_output, partial_path, render_key(video_digest, srt_digest, style, options["profile"], options["mode"])
+        )
+
+    except ffmpeg.Error as e:
+        # Before the first chunk this becomes the error response (see started_stream);
+        # after it, the response has started, so all that is left is to cut it short
+        print(f"Streamed job {job_id} failed: {e.stderr.decode() if e.stderr else str(e)}")
+        raise
+
+    finally:
+        # Unblock the output thread, so ffmpeg is killed if it is still running
+        if chunk is not None:
+            chunk.cancel()
+        closed.set()
+        while not chunks.empty():
+            chunks.get_nowait()
+
+        async def clean_up():
+            await asyncio.gather(encode, return_exceptions=True)
+            await cancel_download(download)
+            partial_path.unlink(missing_ok=True)
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+        # A disconnect cancels every await in here, so the cleanup runs as a task of its own
+        task = asyncio.create_task(clean_up())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        await asyncio.shield(task)
+
+
+async def started_stream(chunks):
+    """
+    Wait for the first chunk of an async generator such as stream_render()
+    and return a generator of all its chunks. Failures before any output (an
+    input ffmpeg rejects straight away) are raised here, while an error
+    response can still be sent.
+    """
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        return chunks
+
+    async def resumed():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return resumed()
+
+
+async def run_background_job(job_id: str, job_dir: Path, key: Optional[str], video_path: Path, srt_path: Path,
+                             options: dict, fetch: Optional[Callable] = None):
+    """
+    Encode a queued job and record the outcome in the store. Without a key,
+    fetch() downloads and validates the inputs first and returns it.
+    """
+    try:
+        if key is None:
+            key = await fetch()
+            await run_store(store.update_job, job_id, key=key)
+        await render_cached(job_id, key, video_path, srt_path, options)
+        await run_store(store.update_job, job_id, status="done", finished_at=time.time())
+
+    except httpx.HTTPError as e:
+        await run_store(
+            store.update_job,
+            job_id, status="failed", finished_at=time.time(), error=f"Failed to download file from URL: {str(e)}"
+        )
+
+    except HTTPException as e:
+        # An input that is too large or invalid
+        await run_store(store.update_job, job_id, status="failed", finished_at=time.time(), error=e.detail)
+
+    except ffmpeg.Error as e:
+        await run_store(
+            store.update_job,
+            job_id, status="failed", finished_at=time.time(),
+            error=f"FFmpeg processing failed: {e.stderr.decode() if e.stderr else str(e)}"
+        )
+
+    except asyncio.CancelledError:
+        await run_store(
+            store.update_job, job_id, status="failed", finished_at=time.time(), error="Job was cancelled"
+        )
+        raise
+
+    except Exception as e:
+        await run_store(
+            store.update_job, job_id, status="failed", finished_at=time.time(), error=f"Unexpected error: {str(e)}"
+        )
+
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def encode_batch_job(job_ids: list, video_path: Path, srt_paths: list, output_paths: list, options: dict,
+                     languages: list, submitted: float):
+    """Run one burn_batch() inside the worker pool, tracking the state of all its jobs in the store."""
+    ENCODE_QUEUE.dec()
+    STAGE_SECONDS.observe(time.perf_counter() - submitted, stage="queue")
+    started = time.time()
+    for job_id in job_ids:
+        store.update_job(job_id, status="running", started_at=started)
+
+    progress = {}
+
+    def report(info: dict):
+        progress.update(info)
+        for job_id in job_ids:
+            store.update_job(job_id, progress=json.dumps(info))
+
+    started = time.perf_counter()
+    with ENCODES_RUNNING.track(), STAGE_SECONDS.time(stage="encode"):
+        burn_batch(
+            str(video_path.absolute()),
+            [str(path.absolute()) for path in srt_paths],
+            [str(path.absolute()) for path in output_paths],
+            options["style"], profile=options["profile"], threads=options["threads"], mode=options["mode"],
+            languages=languages, progress=report
+        )
+    admission.record_encode(time.perf_counter() - started)
+
+    REALTIME_FACTOR.observe(progress.get("speed", 0.0), mode=options["mode"])
+    OUTPUT_BYTES.inc(sum(path.stat().st_size for path in output_paths), mode=options["mode"])
+
+
+async def render_batch_cached(job_ids: list, keys: list, video_path: Path, srt_paths: list, options: dict,
+                              languages: list):
+    """
+    Render the outputs of a batch that are not cached yet, all in one ffmpeg run.
+    For burn, job_ids, keys, srt_paths and languages line up (one output per
+    subtitle file); for mux there is a single job and key, whose output carries
+    every subtitle file as a track.
+    """
+    if options["mode"] == "mux":
+        missing = [0] if await run_store(store.get_output, keys[0]) is None else []
+        sources, tags = srt_paths, languages
+    else:
+        missing = [i for i, key in enumerate(keys) if await run_store(store.get_output, key) is None]
+        sources, tags = [srt_paths[i] for i in missing], [languages[i] for i in missing]
+    if not missing:
+        print(f"Cache hit for jobs {', '.join(job_ids)}, skipping encode")
+        return
+
+    # Ensure OUTPUT_DIR exists (in case it was deleted)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Encode next to the final paths and rename, as render_cached does
+    partial_paths = [OUTPUT_DIR / f"{keys[i]}.{job_ids[i]}.part.mp4" for i in missing]
+    loop = asyncio.get_running_loop()
+    try:
+        ENCODE_QUEUE.inc()
+        await loop.run_in_executor(
+            encode_pool, encode_batch_job, [job_ids[i] for i in missing], video_path, sources, partial_paths,
+            options, tags, time.perf_counter()
+        )
+        for i, partial_path in zip(missing, partial_paths):
+            os.replace(partial_path, store.output_path(keys[i]))
+    finally:
+        for partial_path in partial_paths:
+            partial_path.unlink(missing_ok=True)
+
+    for i in missing:
+        await run_store(store.add_output, keys[i], store.output_path(keys[i]))
+
+
+async def run_batch_job(job_ids: list, job_dir: Path, keys: list, video_path: Path, srt_paths: list,
+                        options: dict, languages: list):
+    """Encode a queued batch and record the outcome on every job in it."""
+    async def finish(**fields):
+        for job_id in job_ids:
+            await run_store(store.update_job, job_id, finished_at=time.time(), **fields)
+
+    try:
+        await render_batch_cached(job_ids, keys, video_path, srt_paths, options, languages)
+        await finish(status="done")
+
+    except ffmpeg.Error as e:
+        await finish(status="failed", error=f"FFmpeg processing failed: {e.stderr.decode() if e.stderr else str(e)}")
+
+    except asyncio.CancelledError:
+        await finish(status="failed", error="Job was cancelled")
+        raise
+
+    except Exception as e:
+        await finish(status="failed", error=f"Unexpected error: {str(e)}")
+
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+async def transcribe_video(video_path: Path, model: str, options: dict) -> dict:
+    """
+    Transcribe the audio of a video with the shared model pool, reusing a
+    cached result for the same audio and options when there is one.
+    """
+    loop = asyncio.get_running_loop()
+    # Decoding only waits on ffmpeg, hashing is plain CPU work; neither runs on the event loop
+    with STAGE_SECONDS.time(stage="decode_audio"):
+        audio = await loop.run_in_executor(encode_pool, load_audio, str(video_path.absolute()))
+    key = await loop.run_in_executor(None, transcript_key, audio, {"model": model, **options})
+
+    result = await loop.run_in_executor(None, load_transcript, str(TRANSCRIPT_DIR), key)
+    if result is not None:
+        print(f"Transcript cache hit for {video_path.name}")
+        return result
+
+    with STAGE_SECONDS.time(stage="transcribe"):
+        result = await model_pool.transcribe(model, audio, **options)
+    await loop.run_in_executor(
+        None, save_transcript, str(TRANSCRIPT_DIR), key, result, TRANSCRIPT_CACHE_BUDGET
+    )
+    return result
+
+
+def sse_event(event: str, data: dict) -> str:
+    """One Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+
+def cue_event(index: int, segment: dict) -> str:
+    """The `cue` event of a segment, numbered from 1."""
+    return sse_event("cue", {
+        "index": index, "start": segment["start"], "end": segment["end"],
+        "text": segment["text"].strip(), "srt": srt_cue(index, segment)
+    })
+
+
+async def stream_transcription(job_dir: Path, video_path: Path, model: str, options: dict):
+    """
+    Server-Sent Events for a streamed transcription: a `cue` event per segment
+    as soon as its window is decoded, then `done`, or `error` if it fails.
+    Complete streams are saved to the transcript cache and replayed from it.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        with STAGE_SECONDS.time(stage="decode_audio"):
+            audio = await loop.run_in_executor(encode_pool, load_audio, str(video_path.absolute()))
+        key = await loop.run_in_executor(None, transcript_key, audio, {"model": model, "stream": True, **options})
+        cached = await loop.run_in_executor(None, load_transcript, str(TRANSCRIPT_DIR), key)
+
+        if cached is not None:
+            segments = cached["segments"]
+            for index, segment in enumerate(segments, start=1):
+                yield cue_event(index, segment)
+        else:
+            segments = []
+            with STAGE_SECONDS.time(stage="transcribe"):
+                async for segment in model_pool.transcribe_stream(model, audio, **options):
+                    segments.append(segment)
+                    yield cue_event(len(segments), segment)
+            await loop.run_in_executor(
+                None, save_transcript, str(TRANSCRIPT_DIR), key, {"segments": segments}, TRANSCRIPT_CACHE_BUDGET
+            )
+
+        yield sse_event("done", {"cues": len(segments)})
+
+    except ffmpeg.Error as e:
+        error_msg = e.stderr.decode() if e.stderr else str(e)
+        yield sse_event("error", {"detail": f"Could not read audio from the video: {error_msg}"})
+
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Unexpected error: {str(e)}"})
+
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def srt_text(segments: list) -> str:
+    """Segments rendered as an SRT document."""
+    srt = io.StringIO()
+    write_srt(segments, file=srt)
+    return srt.getvalue()
+
+
+async def subtitle_video(video_path: Path, srt_path: Path, video_digest: str, model: str,
+                         transcription: dict, style: str, options: dict) -> str:
+    """Transcribe a video into srt_path. Returns the render key of burning it with options."""
+    result = await transcribe_video(video_path, model, transcription)
+    with open(srt_path, "w", encoding="utf-8") as srt:
+        write_srt(result["segments"], file=srt)
+
+    return render_key(video_digest, file_digest(str(srt_path)), style, options["profile"], options["mode"])
+
+
+async def run_auto_subtitle_job(job_id: str, job_dir: Path, video_path: Path, video_digest: str,
+                                model: str, transcription: dict, style: str, options: dict):
+    """Transcribe and encode a queued /auto-subtitle job and record the outcome in the store."""
+    srt_path = job_dir / "subtitles.srt"
+    try:
+        await run_store(store.update_job, job_id, status="running", started_at=time.time())
+        key = await subtitle_video(video_path, srt_path, video_digest, model, transcription, style, options)
+        await run_store(store.update_job, job_id, key=key)
+
+    except asyncio.CancelledError:
+        await run_store(
+            store.update_job, job_id, status="failed", finished_at=time.time(), error="Job was cancelled"
+        )
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    except Exception as e:
+        await run_store(
+            store.update_job, job_id, status="failed", finished_at=time.time(),
+            error=f"Transcription failed: {str(e)}"
+        )
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return
+
+    await run_background_job(job_id, job_dir, key, video_path, srt_path, options)
+
+
+def remove_orphaned_dirs(startup: bool = False):
+    """
+    Remove the job directories of workers that stopped sending heartbeats.
+    On startup, anything else left in TEMP_DIR is removed as well.
+    """
+    live_workers = store.live_workers(WORKER_STALE_AFTER)
+    if not TEMP_DIR.exists():
+        return
+    for item in TEMP_DIR.iterdir():
+        if not item.is_dir() or item.resolve() == OUTPUT_DIR.resolve():
+            continue
+        if item.name.startswith("worker-"):
+            if item.name[len("worker-"):] in live_workers:
+                continue
+        elif not startup:
+            continue
+        shutil.rmtree(item, ignore_errors=True)
+
+
+async def reap_outputs():
+    """
+    Periodically send this worker's heartbeat, fail the jobs of workers that
+    are gone and remove their job directories, drop expired jobs and keep
+    OUTPUT_DIR within its disk budget.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(REAPER_INTERVAL)
+        try:
+            await loop.run_in_executor(None, store.heartbeat)
+            # Partial outputs of live jobs can sit idle while a client or a
+            # download is slow, so only long-abandoned ones are removed here
+            await loop.run_in_executor(None, store.recover, WORKER_STALE_AFTER, OUTPUT_TTL)
+            await loop.run_in_executor(None, remove_orphaned_dirs)
+            jobs_removed, outputs_removed = await loop.run_in_executor(None, store.reap)
+            if jobs_removed or outputs_removed:
+                print(f"Reaper removed {jobs_removed} expired jobs and {outputs_removed} outputs")
+        except Exception as e:
+            print(f"Reaper failed: {str(e)}")
+
+
 @app.post("/burn-subtitles")
 async def burn_subtitles(
     request: Request,
@@ -65,10 +1030,16 @@ async def burn_subtitles(
     video_url: Optional[str] = Form(None, description="URL to video file (alternative to upload)"),
     srt_url: Optional[str] = Form(None, description="URL to SRT file (alternative to upload)"),
     style: Optional[str] = Form(
-        "OutlineColour=&H40000000,BorderStyle=3",
+        DEFAULT_STYLE,
         description="FFmpeg subtitle style options"
     ),
-    output_name: Optional[str] = Form(None, description="Custom output filename (without extension)")
+    output_name: Optional[str] = Form(None, description="Custom output filename (without extension)"),
+    async_mode: bool = Form(False, description="Return a job_id immediately and encode in the background"),
+    parallel: int = Form(1, ge=1, description="Split the video at keyframes and encode this many segments at once"),
+    smart: bool = Form(False, description="Only re-encode the parts of the video that carry subtitles"),
+    profile: Optional[str] = Form(None, description="Encoding profile: fast, balanced or archive (default: ENCODING_PROFILE)"),
+    mode: str = Form("burn", description="burn: render subtitles into the picture; mux: add a soft subtitle track without re-encoding"),
+    ttl_hours: Optional[float] = Form(None, gt=0, description="How long the download link stays valid (default: OUTPUT_TTL_HOURS)")
 ):
     """
     Burn SRT subtitles into a video file. Returns a download URL.
@@ -79,8 +1050,14 @@ async def burn_subtitles(
     - **srt_url**: URL to SRT file
     - **style**: Optional FFmpeg style string for subtitle appearance
     - **output_name**: Optional custom name for output file
+    - **async_mode**: If true, respond right away with a job_id and poll GET /jobs/{job_id}
+    - **ttl_hours**: Optional lifetime of the download link
+    - **parallel**: Number of ffmpeg processes to encode with (capped at MAX_PARALLEL)
+    - **smart**: Re-encode only the GOPs that overlap a subtitle and stream-copy the rest
+    - **profile**: Encoding profile (x264 preset, CRF and audio passthrough)
+    - **mode**: "burn" (default) or "mux" to add a selectable mov_text track and copy the video
     
-    Returns JSON with download URL. File will be deleted on server restart.
+    Returns JSON with download URL. The file is removed once its TTL expires.
     You can mix and match: e.g., upload video + provide SRT URL
     """
     
@@ -92,66 +1069,66 @@ async def burn_subtitles(
     
     # Generate unique ID for this job
     job_id = str(uuid.uuid4())
-    job_dir = TEMP_DIR / job_id
-    job_dir.mkdir(exist_ok=True)
+    job_dir = WORK_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
     
     video_path = None
     srt_path = None
     output_path = None
     
     try:
-        # Handle video (file or URL)
-        if video:
-            # Upload from file
-            if not video.filename:
-                raise HTTPException(status_code=400, detail="Video filename is required")
-            
-            video_ext = Path(video.filename).suffix
-            video_path = job_dir / f"input{video_ext}"
-            
-            with open(video_path, "wb") as f:
-                content = await video.read()
-                f.write(content)
-        else:
-            # Download from URL
-            print(f"Downloading video from {video_url}...")
-            async with httpx.AsyncClient(timeout=300.0) as client:
-                video_response = await client.get(video_url)
-                video_response.raise_for_status()
-                
-                # Determine file extension from URL
-                video_ext = ".mp4"  # default
-                if "." in video_url.split("/")[-1]:
-                    video_ext = "." + video_url.split(".")[-1].split("?")[0]
-                
-                video_path = job_dir / f"input{video_ext}"
-                with open(video_path, "wb") as f:
-                    f.write(video_response.content)
+        # Validate uploads before starting any transfer
+        if video and not video.filename:
+            raise HTTPException(status_code=400, detail="Video filename is required")
         
-        # Handle SRT (file or URL)
         if srt:
-            # Upload from file
             if not srt.filename:
                 raise HTTPException(status_code=400, detail="SRT filename is required")
             
-            if not srt.filename.lower().endswith('.srt'):
-                raise HTTPException(status_code=400, detail="Subtitle file must be .srt format")
-            
-            srt_path = job_dir / "subtitles.srt"
-            
-            with open(srt_path, "wb") as f:
-                content = await srt.read()
-                f.write(content)
-        else:
-            # Download from URL
+            if not srt.filename.lower().endswith(('.srt', '.vtt')):
+                raise HTTPException(status_code=400, detail="Subtitle file must be .srt or .vtt format")
+        
+        # Handle video (file or URL)
+        video_path = video_input_path(video, video_url, job_dir)
+        srt_path = job_dir / "subtitles.srt"
+        
+        # Handle SRT (file or URL)
+        srt_digest = None
+        async def fetch_srt():
+            if srt_digest:
+                # Saved before a queued job's response
+                return srt_digest
+            if srt:
+                return await save_upload(srt, srt_path)
             print(f"Downloading SRT from {srt_url}...")
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                srt_response = await client.get(srt_url)
-                srt_response.raise_for_status()
-                
-                srt_path = job_dir / "subtitles.srt"
-                with open(srt_path, "wb") as f:
-                    f.write(srt_response.content)
+            return await download_file_to(srt_url, srt_path, timeout=SRT_DOWNLOAD_TIMEOUT)
+        
+        ttl = ttl_hours * 3600 if ttl_hours else None
+        options = render_options(style, parallel, smart, profile, mode)
+        
+        async def fetch_remote(fetch_srt) -> str:
+            # A remote video may be encoded while it downloads
+            video_digest, srt_digest = await fetch_and_encode(
+                job_id, video_url, video_path, srt_path, fetch_srt, style, options
+            )
+            return render_key(video_digest, srt_digest, style, options["profile"], options["mode"])
+        
+        # Fetch both inputs at once so the SRT does not wait behind the video.
+        # Both are hashed while being written to build the cache key.
+        key = None
+        if video_url and not video and async_mode:
+            # The job downloads the video itself, so the response does not wait for it.
+            # An uploaded SRT has to be saved before the request ends.
+            if srt:
+                srt_digest = await save_upload(srt, srt_path)
+        elif video_url and not video:
+            key = await fetch_remote(fetch_srt())
+        else:
+            (video_path, video_digest), srt_digest = await gather_or_cancel(
+                fetch_video_input(video, video_url, job_dir), fetch_srt()
+            )
+            await check_subtitles(srt_path)
+            key = render_key(video_digest, srt_digest, style, options["profile"], options["mode"])
         
         # Determine output filename
         if output_name:
@@ -163,29 +1140,37 @@ async def burn_subtitles(
             else:
                 output_filename = f"subtitled_{job_id[:8]}.mp4"
         
-        # Ensure OUTPUT_DIR exists (in case it was deleted)
-        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        # Build download URL
+        base_url = str(request.base_url).rstrip('/')
+        download_url = f"{base_url}/download/{job_id}"
         
-        # Output directly to OUTPUT_DIR to avoid cross-device copy issues
-        output_path = OUTPUT_DIR / output_filename
+        if async_mode:
+            # Queue the encode and return right away; the job cleans up after itself
+            await run_store(store.create_job, job_id, "queued", output_filename, download_url, key, ttl)
+            # The download coroutines are only created once the job runs
+            fetch = None
+            if key is None:
+                fetch = lambda: fetch_remote(fetch_srt())
+            task = asyncio.create_task(admission.hold(run_background_job(
+                job_id, job_dir, key, video_path, srt_path, options, fetch
+            )))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+            
+            return JSONResponse({
+                "success": True,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"{base_url}/jobs/{job_id}",
+                "download_url": download_url,
+                "filename": output_filename,
+                "message": "Job queued. Poll status_url until status is 'done', then download."
+            }, status_code=202)
         
-        # Process video with ffmpeg
+        # Process video with ffmpeg (or reuse an identical earlier render).
+        # Output goes directly to OUTPUT_DIR to avoid cross-device copy issues.
         try:
-            # Use absolute paths - ffmpeg on Windows needs proper path format
-            video_path_str = str(video_path.absolute())
-            srt_path_str = str(srt_path.absolute())
-            output_path_str = str(output_path.absolute())
-            
-            video_input = ffmpeg.input(video_path_str)
-            audio = video_input.audio
-            
-            # Use filename= parameter for subtitles filter on Windows
-            ffmpeg.concat(
-                video_input.filter('subtitles', filename=srt_path_str, force_style=style),
-                audio,
-                v=1,
-                a=1
-            ).output(output_path_str).run(quiet=True, overwrite_output=True)
+            output_path = await render_cached(job_id, key, video_path, srt_path, options)
             
         except ffmpeg.Error as e:
             error_msg = e.stderr.decode() if e.stderr else str(e)
@@ -195,15 +1180,7 @@ async def burn_subtitles(
             )
         
         # Store in registry
-        file_registry[job_id] = {
-            "filename": output_filename,
-            "created_at": time.time(),
-            "path": output_path
-        }
-        
-        # Build download URL
-        base_url = str(request.base_url).rstrip('/')
-        download_url = f"{base_url}/download/{job_id}"
+        await run_store(store.create_job, job_id, "done", output_filename, download_url, key, ttl)
         
         # Clean up temp files
         shutil.rmtree(job_dir, ignore_errors=True)
@@ -213,52 +1190,227 @@ async def burn_subtitles(
             "job_id": job_id,
             "download_url": download_url,
             "filename": output_filename,
-            "message": "Video processed successfully. File will be deleted on server restart."
+            "message": "Video processed successfully. The download link expires after its TTL."
         })
         
-    except httpx.HTTPError as e:
-        # Clean up on error
-        if job_dir.exists():
-            shutil.rmtree(job_dir, ignore_errors=True)
+    except Exception as e:
+        raise request_error(e, job_dir)
+
+
+@app.post("/burn-subtitles/batch")
+async def burn_subtitles_batch(
+    request: Request,
+    video: Optional[UploadFile] = File(None, description="Video file (mp4, avi, mov, etc.)"),
+    srt: List[UploadFile] = File(..., description="Subtitle files (SRT or WebVTT), e.g. one per language"),
+    video_url: Optional[str] = Form(None, description="URL to video file (alternative to upload)"),
+    languages: Optional[str] = Form(None, description="Comma-separated language of each subtitle file, in order"),
+    style: Optional[str] = Form(
+        DEFAULT_STYLE,
+        description="FFmpeg subtitle style options"
+    ),
+    output_name: Optional[str] = Form(None, description="Custom output filename (without extension)"),
+    async_mode: bool = Form(False, description="Return job_ids immediately and encode in the background"),
+    profile: Optional[str] = Form(None, description="Encoding profile: fast, balanced or archive (default: ENCODING_PROFILE)"),
+    mode: str = Form("burn", description="burn: one video per subtitle file; mux: one video with a soft track per file"),
+    ttl_hours: Optional[float] = Form(None, gt=0, description="How long the download links stay valid (default: OUTPUT_TTL_HOURS)")
+):
+    """
+    Render one video with several subtitle files in a single ffmpeg run, so the
+    video is decoded once instead of once per language.
+    
+    - **video**: Video file to upload OR
+    - **video_url**: URL to video file
+    - **srt**: Subtitle files, repeat the field for each one (at most MAX_BATCH_SUBTITLES)
+    - **languages**: Optional comma-separated language codes; by default taken from names like video.de.srt
+    - **style**: Optional FFmpeg style string for subtitle appearance
+    - **output_name**: Optional custom name for the output files
+    - **async_mode**: If true, respond right away with job_ids and poll GET /jobs/{job_id}
+    - **profile**: Encoding profile (x264 preset, CRF and audio passthrough)
+    - **mode**: "burn" (default) returns one video per subtitle file, "mux" one video with a track per file
+    - **ttl_hours**: Optional lifetime of the download links
+    
+    Returns JSON with one output (job_id, language, download URL) per video.
+    """
+    
+    if not video and not video_url:
+        raise HTTPException(status_code=400, detail="Either 'video' file or 'video_url' is required")
+    if len(srt) > MAX_BATCH_SUBTITLES:
         raise HTTPException(
             status_code=400,
-            detail=f"Failed to download file from URL: {str(e)}"
+            detail=f"At most {MAX_BATCH_SUBTITLES} subtitle files can be rendered in one batch"
+        )
+    for upload in srt:
+        if not upload.filename or not upload.filename.lower().endswith(('.srt', '.vtt')):
+            raise HTTPException(status_code=400, detail="Subtitle files must be .srt or .vtt format")
+    
+    tags = [subtitle_language(upload.filename) for upload in srt]
+    if languages:
+        tags = [language.strip() or None for language in languages.split(",")]
+        if len(tags) != len(srt):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Got {len(tags)} languages for {len(srt)} subtitle files"
+            )
+    options = render_options(style, 1, False, profile, mode)
+    
+    # Generate unique ID for this batch; the jobs of its outputs get their own
+    batch_id = str(uuid.uuid4())
+    job_dir = WORK_DIR / batch_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        # Handle video (file or URL)
+        srt_paths = [job_dir / f"subtitles{i}.srt" for i in range(len(srt))]
+        digests = await gather_or_cancel(
+            fetch_video_input(video, video_url, job_dir),
+            *(save_upload(upload, path) for upload, path in zip(srt, srt_paths))
         )
+        (video_path, video_digest), srt_digests = digests[0], digests[1:]
+        for upload, path in zip(srt, srt_paths):
+            try:
+                await check_subtitles(path)
+            except HTTPException as e:
+                raise HTTPException(status_code=400, detail=f"{upload.filename}: {e.detail}")
         
-    except HTTPException:
-        # Clean up on error
-        if job_dir.exists():
-            shutil.rmtree(job_dir, ignore_errors=True)
-        raise
+        # One output per subtitle file, or a single one carrying every file as a track
+        stem = output_name or (Path(video.filename).stem if video and video.filename else f"subtitled_{batch_id[:8]}")
+        if options["mode"] == "mux":
+            keys = [render_key(
+                video_digest, ",".join(srt_digests), style, options["profile"], "mux", ",".join(tag or "" for tag in tags)
+            )]
+            filenames = [f"{stem}.mp4"]
+            labels = [",".join(tag or "" for tag in tags)]
+        else:
+            keys = [
+                render_key(video_digest, digest, style, options["profile"], options["mode"])
+                for digest in srt_digests
+            ]
+            filenames = [
+                f"{stem}_{tag or Path(upload.filename).stem}.mp4" for upload, tag in zip(srt, tags)
+            ]
+            labels = tags
+        job_ids = [str(uuid.uuid4()) for _ in keys]
+        
+        base_url = str(request.base_url).rstrip('/')
+        outputs = [
+            {
+                "job_id": job_id,
+                "language": label,
+                "download_url": f"{base_url}/download/{job_id}",
+                "filename": output_filename
+            }
+            for job_id, label, output_filename in zip(job_ids, labels, filenames)
+        ]
+        ttl = ttl_hours * 3600 if ttl_hours else None
+        
+        if async_mode:
+            # Queue the batch and return right away; it cleans up after itself
+            for job_id, key, output in zip(job_ids, keys, outputs):
+                await run_store(
+                    store.create_job, job_id, "queued", output["filename"], output["download_url"], key, ttl
+                )
+            task = asyncio.create_task(admission.hold(run_batch_job(
+                job_ids, job_dir, keys, video_path, srt_paths, options, tags
+            )))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+            
+            for output in outputs:
+                output["status_url"] = f"{base_url}/jobs/{output['job_id']}"
+            return JSONResponse({
+                "success": True,
+                "status": "queued",
+                "outputs": outputs,
+                "message": "Jobs queued. Poll each status_url until status is 'done', then download."
+            }, status_code=202)
+        
+        try:
+            await render_batch_cached(job_ids, keys, video_path, srt_paths, options, tags)
+            
+        except ffmpeg.Error as e:
+            error_msg = e.stderr.decode() if e.stderr else str(e)
+            raise HTTPException(
+                status_code=500,
+                detail=f"FFmpeg processing failed: {error_msg}"
+            )
+        
+        for job_id, key, output in zip(job_ids, keys, outputs):
+            await run_store(store.create_job, job_id, "done", output["filename"], output["download_url"], key, ttl)
+        
+        # Clean up temp files
+        shutil.rmtree(job_dir, ignore_errors=True)
+        
+        return JSONResponse({
+            "success": True,
+            "outputs": outputs,
+            "message": "Videos processed successfully. The download links expire after their TTL."
+        })
         
     except Exception as e:
-        # Clean up on error
-        if job_dir.exists():
-            shutil.rmtree(job_dir, ignore_errors=True)
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+        raise request_error(e, job_dir)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get the state of a background job submitted with async_mode=true.
+    """
+    job = await run_store(store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job.pop("key", None)
+    if job["status"] != "done":
+        job["download_url"] = None
+    # Percent, fps, speed and ETA of a running encode (see progress.ProgressTracker)
+    job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+    
+    return job
+
+
+@app.get("/cache")
+async def cache_stats():
+    """
+    Statistics for the content-addressed output cache.
+    """
+    return await run_store(store.stats)
 
 
-@app.get("/download/{job_id}")
-async def download_file(job_id: str):
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Metrics of this worker process in the Prometheus text format.
+    """
+    for model in WHISPER_MODELS:
+        if model in model_pool:
+            TRANSCRIPTIONS_RUNNING.set(model_pool.busy(model), model=model)
+
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
+@app.api_route("/download/{job_id}", methods=["GET", "HEAD"])
+async def download_file(job_id: str, request: Request):
     """
     Download a processed video file by job ID.
-    Files are temporary and will be deleted on server restart.
+    Files are kept until their TTL expires or the disk budget evicts them.
+    
+    Supports byte ranges (206) for seeking and resuming, conditional requests
+    with If-None-Match (304) against a strong ETag, and HEAD.
     """
-    if job_id not in file_registry:
+    found = await run_store(store.get_job_output, job_id)
+    if found is None:
         raise HTTPException(status_code=404, detail="File not found or expired")
     
-    file_info = file_registry[job_id]
-    file_path = file_info["path"]
-    
-    if not file_path.exists():
-        # Clean up registry if file is missing
-        del file_registry[job_id]
-        raise HTTPException(status_code=404, detail="File not found")
+    job, file_path = found
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        # Evicted since the lookup
+        raise HTTPException(status_code=404, detail="File not found or expired")
+    await run_store(store.touch_output, job["key"])
     
-    return FileResponse(
-        path=file_path,
-        media_type="video/mp4",
-        filename=file_info["filename"]
+    return file_response(
+        file_path, stat, output_etag(job["key"], stat), job["filename"], request.headers, request.method
     )
 
 
@@ -267,10 +1419,15 @@ async def burn_subtitles_url(
     video_url: str = Form(..., description="URL to video file"),
     srt_url: str = Form(..., description="URL to SRT subtitle file"),
     style: Optional[str] = Form(
-        "OutlineColour=&H40000000,BorderStyle=3",
+        DEFAULT_STYLE,
         description="FFmpeg subtitle style options"
     ),
-    output_name: Optional[str] = Form(None, description="Custom output filename (without extension)")
+    output_name: Optional[str] = Form(None, description="Custom output filename (without extension)"),
+    parallel: int = Form(1, ge=1, description="Split the video at keyframes and encode this many segments at once"),
+    smart: bool = Form(False, description="Only re-encode the parts of the video that carry subtitles"),
+    profile: Optional[str] = Form(None, description="Encoding profile: fast, balanced or archive (default: ENCODING_PROFILE)"),
+    mode: str = Form("burn", description="burn: render subtitles into the picture; mux: add a soft subtitle track without re-encoding"),
+    stream: bool = Form(False, description="Send the video while it is encoded, as fragmented MP4")
 ):
     """
     Burn SRT subtitles into a video file using URLs.
@@ -279,42 +1436,28 @@ async def burn_subtitles_url(
     - **srt_url**: Direct URL to SRT subtitle file
     - **style**: Optional FFmpeg style string for subtitle appearance
     - **output_name**: Optional custom name for output file
+    - **parallel**: Number of ffmpeg processes to encode with (capped at MAX_PARALLEL)
+    - **smart**: Re-encode only the GOPs that overlap a subtitle and stream-copy the rest
+    - **profile**: Encoding profile (x264 preset, CRF and audio passthrough)
+    - **mode**: "burn" (default) or "mux" to add a selectable mov_text track and copy the video
+    - **stream**: If true, the response starts within seconds and carries the video as it is encoded
+      (fragmented MP4, no Content-Length); the finished video is cached as usual
     """
     
     # Generate unique ID for this job
     job_id = str(uuid.uuid4())
-    job_dir = TEMP_DIR / job_id
-    job_dir.mkdir(exist_ok=True)
+    job_dir = WORK_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
     
     video_path = None
     srt_path = None
     output_path = None
     
     try:
-        # Download video from URL
-        print(f"Downloading video from {video_url}...")
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            video_response = await client.get(video_url)
-            video_response.raise_for_status()
-            
-            # Determine file extension from URL or content-type
-            video_ext = ".mp4"  # default
-            if "." in video_url.split("/")[-1]:
-                video_ext = "." + video_url.split(".")[-1].split("?")[0]
-            
-            video_path = job_dir / f"input{video_ext}"
-            with open(video_path, "wb") as f:
-                f.write(video_response.content)
+        options = render_options(style, parallel, smart, profile, mode)
         
-        # Download SRT from URL
-        print(f"Downloading SRT from {srt_url}...")
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            srt_response = await client.get(srt_url)
-            srt_response.raise_for_status()
-            
-            srt_path = job_dir / "subtitles.srt"
-            with open(srt_path, "wb") as f:
-                f.write(srt_response.content)
+        video_path = video_input_path(None, video_url, job_dir)
+        srt_path = job_dir / "subtitles.srt"
         
         # Determine output filename
         if output_name:
@@ -322,25 +1465,45 @@ async def burn_subtitles_url(
         else:
             output_filename = f"subtitled_{job_id[:8]}.mp4"
         
-        output_path = job_dir / output_filename
+        if stream:
+            print(f"Downloading SRT from {srt_url}...")
+            download, srt_digest, growing = await fetch_inputs(
+                video_url, video_path, srt_path,
+                download_file_to(srt_url, srt_path, timeout=SRT_DOWNLOAD_TIMEOUT), options
+            )
+            if growing is None:
+                # Downloaded in full (or known to be rendered already), so an
+                # identical earlier render can be sent instead
+                key = render_key(download.result(), srt_digest, style, options["profile"], options["mode"])
+                output_path = await run_store(store.get_output, key)
+                if output_path is not None:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                    return FileResponse(path=output_path, media_type="video/mp4", filename=output_filename)
+            
+            # The generator owns job_dir and the download from here on. Its
+            # first chunk is awaited here, so an encode that fails right away
+            # gets the same 500 as without streaming.
+            chunks = await started_stream(
+                stream_render(job_id, job_dir, download, srt_digest, video_path, srt_path, style, options, growing)
+            )
+            return StreamingResponse(
+                chunks,
+                media_type="video/mp4",
+                headers={"Content-Disposition": f'attachment; filename="{output_filename}"'}
+            )
         
-        # Process video with ffmpeg
+        # Download video and SRT concurrently, encoding while the video
+        # downloads where its container allows it
+        print(f"Downloading SRT from {srt_url}...")
+        video_digest, srt_digest = await fetch_and_encode(
+            job_id, video_url, video_path, srt_path,
+            download_file_to(srt_url, srt_path, timeout=SRT_DOWNLOAD_TIMEOUT), style, options
+        )
+        
+        # Process video with ffmpeg (or reuse an identical earlier render)
         try:
-            # Use absolute paths - ffmpeg on Windows needs proper path format
-            video_path_str = str(video_path.absolute())
-            srt_path_str = str(srt_path.absolute())
-            output_path_str = str(output_path.absolute())
-            
-            video_input = ffmpeg.input(video_path_str)
-            audio = video_input.audio
-            
-            # Use filename= parameter for subtitles filter on Windows
-            ffmpeg.concat(
-                video_input.filter('subtitles', filename=srt_path_str, force_style=style),
-                audio,
-                v=1,
-                a=1
-            ).output(output_path_str).run(quiet=True, overwrite_output=True)
+            key = render_key(video_digest, srt_digest, style, options["profile"], options["mode"])
+            output_path = await render_cached(job_id, key, video_path, srt_path, options)
             
         except ffmpeg.Error as e:
             error_msg = e.stderr.decode() if e.stderr else str(e)
@@ -349,6 +1512,9 @@ async def burn_subtitles_url(
                 detail=f"FFmpeg processing failed: {error_msg}"
             )
         
+        # Inputs are no longer needed once the output is in OUTPUT_DIR
+        shutil.rmtree(job_dir, ignore_errors=True)
+        
         # Return the processed video
         return FileResponse(
             path=output_path,
@@ -357,42 +1523,269 @@ async def burn_subtitles_url(
             background=None
         )
         
-    except httpx.HTTPError as e:
-        # Clean up on error
-        if job_dir.exists():
-            shutil.rmtree(job_dir, ignore_errors=True)
-        raise HTTPException(
-            status_code=400,
-            detail=f"Failed to download file: {str(e)}"
+    except Exception as e:
+        raise request_error(e, job_dir)
+
+
+@app.post("/transcribe")
+async def transcribe(
+    video: Optional[UploadFile] = File(None, description="Video or audio file"),
+    video_url: Optional[str] = Form(None, description="URL to video file (alternative to upload)"),
+    model: Optional[str] = Form(None, description="Whisper model, one of WHISPER_MODELS (default: the first)"),
+    task: str = Form("transcribe", description="transcribe (X->X) or translate (X->English)"),
+    language: Optional[str] = Form(None, description="Spoken language; detected automatically if unset"),
+    format: str = Form("srt", description="Response format: srt, vtt or json")
+):
+    """
+    Transcribe a video with a Whisper model that is already loaded.
+    
+    - **video**: Video file to upload OR
+    - **video_url**: URL to video file
+    - **model**: Whisper model (see WHISPER_MODELS)
+    - **task**: "transcribe" or "translate"
+    - **language**: Optional language code, e.g. "en"
+    - **format**: "srt" or "vtt" returns the subtitle file, "json" the language, text and segments
+    """
+    
+    if not video and not video_url:
+        raise HTTPException(status_code=400, detail="Either 'video' file or 'video_url' is required")
+    if format not in ("srt", "vtt", "json"):
+        raise HTTPException(status_code=400, detail="Format must be 'srt', 'vtt' or 'json'")
+    model, transcription = transcription_options(model, task, language)
+    
+    job_id = str(uuid.uuid4())
+    job_dir = WORK_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        # Handle video (file or URL)
+        video_path, _ = await fetch_video_input(video, video_url, job_dir)
+        
+        try:
+            result = await transcribe_video(video_path, model, transcription)
+        except ffmpeg.Error as e:
+            error_msg = e.stderr.decode() if e.stderr else str(e)
+            raise HTTPException(status_code=400, detail=f"Could not read audio from the video: {error_msg}")
+        
+        if format == "json":
+            return JSONResponse({
+                "language": result.get("language"),
+                "text": result.get("text", ""),
+                "segments": [
+                    {"start": segment["start"], "end": segment["end"], "text": segment["text"].strip()}
+                    for segment in result["segments"]
+                ]
+            })
+        
+        name = Path(video.filename).stem if video and video.filename else f"transcript_{job_id[:8]}"
+        if format == "vtt":
+            vtt = io.StringIO()
+            write_vtt(result["segments"], vtt)
+            return Response(
+                content=vtt.getvalue(),
+                media_type="text/vtt",
+                headers={"Content-Disposition": f'attachment; filename="{name}.vtt"'}
+            )
+        return Response(
+            content=srt_text(result["segments"]),
+            media_type="application/x-subrip",
+            headers={"Content-Disposition": f'attachment; filename="{name}.srt"'}
         )
         
-    except HTTPException:
-        # Clean up on error
-        if job_dir.exists():
-            shutil.rmtree(job_dir, ignore_errors=True)
-        raise
+    except Exception as e:
+        raise request_error(e, job_dir)
+    
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+@app.post("/transcribe/stream")
+async def transcribe_stream_events(
+    video: Optional[UploadFile] = File(None, description="Video or audio file"),
+    video_url: Optional[str] = Form(None, description="URL to video file (alternative to upload)"),
+    model: Optional[str] = Form(None, description="Whisper model, one of WHISPER_MODELS (default: the first)"),
+    task: str = Form("transcribe", description="transcribe (X->X) or translate (X->English)"),
+    language: Optional[str] = Form(None, description="Spoken language; detected automatically if unset")
+):
+    """
+    Transcribe a video and stream the cues as Server-Sent Events while Whisper
+    works through it, about every 30 seconds of speech.
+    
+    - **video**: Video file to upload OR
+    - **video_url**: URL to video file
+    - **model**, **task**, **language**: As for POST /transcribe
+    
+    Events: `cue` (index, start, end, text and the cue as SRT), then `done`
+    (number of cues), or `error` (detail) if transcription fails.
+    """
+    
+    if not video and not video_url:
+        raise HTTPException(status_code=400, detail="Either 'video' file or 'video_url' is required")
+    model, transcription = transcription_options(model, task, language)
+    
+    job_id = str(uuid.uuid4())
+    job_dir = WORK_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        # Handle video (file or URL)
+        video_path, _ = await fetch_video_input(video, video_url, job_dir)
         
     except Exception as e:
-        # Clean up on error
-        if job_dir.exists():
-            shutil.rmtree(job_dir, ignore_errors=True)
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+        raise request_error(e, job_dir)
+    
+    # The job directory is removed once the stream ends
+    return StreamingResponse(
+        stream_transcription(job_dir, video_path, model, transcription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/auto-subtitle")
+async def auto_subtitle(
+    request: Request,
+    video: Optional[UploadFile] = File(None, description="Video file (mp4, avi, mov, etc.)"),
+    video_url: Optional[str] = Form(None, description="URL to video file (alternative to upload)"),
+    model: Optional[str] = Form(None, description="Whisper model, one of WHISPER_MODELS (default: the first)"),
+    task: str = Form("transcribe", description="transcribe (X->X) or translate (X->English)"),
+    language: Optional[str] = Form(None, description="Spoken language; detected automatically if unset"),
+    style: Optional[str] = Form(
+        DEFAULT_STYLE,
+        description="FFmpeg subtitle style options"
+    ),
+    output_name: Optional[str] = Form(None, description="Custom output filename (without extension)"),
+    async_mode: bool = Form(False, description="Return a job_id immediately and transcribe and encode in the background"),
+    parallel: int = Form(1, ge=1, description="Split the video at keyframes and encode this many segments at once"),
+    smart: bool = Form(False, description="Only re-encode the parts of the video that carry subtitles"),
+    profile: Optional[str] = Form(None, description="Encoding profile: fast, balanced or archive (default: ENCODING_PROFILE)"),
+    mode: str = Form("burn", description="burn: render subtitles into the picture; mux: add a soft subtitle track without re-encoding"),
+    ttl_hours: Optional[float] = Form(None, gt=0, description="How long the download link stays valid (default: OUTPUT_TTL_HOURS)")
+):
+    """
+    Transcribe a video with Whisper and burn the subtitles into it. Returns a download URL.
+    
+    - **video**: Video file to upload OR
+    - **video_url**: URL to video file
+    - **model**, **task**, **language**: Transcription settings, as for POST /transcribe
+    - **style**, **output_name**, **async_mode**, **ttl_hours**, **parallel**, **smart**,
+      **profile**, **mode**: Render settings, as for POST /burn-subtitles
+    """
+    
+    if not video and not video_url:
+        raise HTTPException(status_code=400, detail="Either 'video' file or 'video_url' is required")
+    model, transcription = transcription_options(model, task, language)
+    options = render_options(style, parallel, smart, profile, mode)
+    
+    job_id = str(uuid.uuid4())
+    job_dir = WORK_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        # Handle video (file or URL)
+        video_path, video_digest = await fetch_video_input(video, video_url, job_dir)
+        srt_path = job_dir / "subtitles.srt"
+        
+        ttl = ttl_hours * 3600 if ttl_hours else None
+        
+        # Determine output filename
+        if output_name:
+            output_filename = f"{output_name}.mp4"
+        elif video and video.filename:
+            output_filename = f"{Path(video.filename).stem}_subtitled.mp4"
+        else:
+            output_filename = f"subtitled_{job_id[:8]}.mp4"
+        
+        base_url = str(request.base_url).rstrip('/')
+        download_url = f"{base_url}/download/{job_id}"
+        
+        if async_mode:
+            # The render key is only known once the transcription is done
+            await run_store(store.create_job, job_id, "queued", output_filename, download_url, None, ttl)
+            job = asyncio.create_task(admission.hold(run_auto_subtitle_job(
+                job_id, job_dir, video_path, video_digest, model, transcription, style, options
+            )))
+            background_tasks.add(job)
+            job.add_done_callback(background_tasks.discard)
+            
+            return JSONResponse({
+                "success": True,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"{base_url}/jobs/{job_id}",
+                "download_url": download_url,
+                "filename": output_filename,
+                "message": "Job queued. Poll status_url until status is 'done', then download."
+            }, status_code=202)
+        
+        try:
+            key = await subtitle_video(video_path, srt_path, video_digest, model, transcription, style, options)
+            await render_cached(job_id, key, video_path, srt_path, options)
+            
+        except ffmpeg.Error as e:
+            error_msg = e.stderr.decode() if e.stderr else str(e)
+            raise HTTPException(
+                status_code=500,
+                detail=f"FFmpeg processing failed: {error_msg}"
+            )
+        
+        await run_store(store.create_job, job_id, "done", output_filename, download_url, key, ttl)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        
+        return JSONResponse({
+            "success": True,
+            "job_id": job_id,
+            "download_url": download_url,
+            "filename": output_filename,
+            "message": "Video processed successfully. The download link expires after its TTL."
+        })
+        
+    except Exception as e:
+        raise request_error(e, job_dir)
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Clean up old temp files on startup"""
-    if TEMP_DIR.exists():
-        for item in TEMP_DIR.iterdir():
-            if item.is_dir():
-                shutil.rmtree(item, ignore_errors=True)
+    """Create the shared HTTP client, reload the job registry, clean up old temp files and load the Whisper models on startup"""
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=VIDEO_DOWNLOAD_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS // 5 or 1
+        )
+    )
+    
+    # Keep finished outputs; only drop jobs and job directories of workers that are gone.
+    # Recover before the first heartbeat, so a worker is never mistaken for the one it replaces.
+    store.recover(WORKER_STALE_AFTER)
+    store.heartbeat()
+    remove_orphaned_dirs(startup=True)
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    
+    # Load the Whisper models before serving, so no request pays for it
+    if WHISPER_MODELS:
+        try:
+            await model_pool.load()
+        except ImportError:
+            print("openai-whisper is not installed, transcription endpoints are disabled")
+    
+    task = asyncio.create_task(reap_outputs())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Clean up temp directory on shutdown"""
-    if TEMP_DIR.exists():
-        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    """Stop the encode and model pools and the reaper, close the HTTP client and clean up this worker's job directories on shutdown"""
+    encode_pool.shutdown(wait=False, cancel_futures=True)
+    model_pool.shutdown()
+    for task in list(background_tasks):
+        task.cancel()
+    if http_client is not None:
+        await http_client.aclose()
+    store.remove_worker()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
 
 
 if __name__ == "__main__":
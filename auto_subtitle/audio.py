@@ -0,0 +1,107 @@
+import ffmpeg
+import tempfile
+import threading
+import numpy as np
+from typing import Optional
+from .metrics import FFMPEG_ACTIVE, wait_process
+
+
+# Whisper works on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Bytes read from the ffmpeg pipe at a time
+READ_SIZE = 1024 * 1024
+
+
+def probe_audio_duration(path: str) -> Optional[float]:
+    """Duration of a media file in seconds, or None if ffprobe cannot tell."""
+    try:
+        return float(ffmpeg.probe(path)["format"]["duration"])
+    except (ffmpeg.Error, KeyError, ValueError):
+        return None
+
+
+def allocate(samples: int, spill_dir: Optional[str] = None) -> np.ndarray:
+    """
+    A float32 buffer for `samples` samples, in memory or, with spill_dir, in an
+    anonymous memory-mapped file there that the OS pages in and out as needed.
+    """
+    if spill_dir is None:
+        return np.empty(samples, dtype=np.float32)
+
+    # The file has no name, so it goes away with the mapping
+    return np.memmap(tempfile.TemporaryFile(dir=spill_dir), dtype=np.float32, mode="w+", shape=(samples,))
+
+
+def load_audio(path: str, sr: int = SAMPLE_RATE, spill_after: Optional[float] = None,
+               spill_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Decode the audio of a media file into a mono float32 array in [-1, 1],
+    the input Whisper's transcribe() takes, without writing a WAV first.
+
+    ffmpeg writes float samples to a pipe that is read straight into a buffer
+    sized from the probed duration, so the audio is decoded once and never
+    copied. Inputs longer than `spill_after` seconds are decoded into a
+    memory-mapped file in `spill_dir` (default: the temp dir) instead of RAM.
+    Raises ffmpeg.Error if ffmpeg fails.
+    """
+    duration = probe_audio_duration(path)
+    if duration is not None and spill_after is not None and duration > spill_after:
+        spill_dir = spill_dir or tempfile.gettempdir()
+    else:
+        spill_dir = None
+
+    process = (
+        ffmpeg.input(path)
+        .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=sr)
+        # Only errors are logged; stderr is drained on its own thread (see read_samples)
+        .global_args("-nostats", "-loglevel", "error")
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+    with FFMPEG_ACTIVE.track():
+        return read_samples(process, duration, sr, spill_dir)
+
+
+def read_samples(process, duration: Optional[float], sr: int, spill_dir: Optional[str]) -> np.ndarray:
+    """Read the float32 samples load_audio's ffmpeg process writes to stdout."""
+    # A damaged input can log more than the stderr pipe holds, which would
+    # block ffmpeg while stdout is waited on, so stderr is drained alongside
+    stderr = []
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    reader.start()
+
+    try:
+        # Leave a second of slack for durations that are rounded down
+        buffer = allocate(int((duration or 0) * sr) + sr, spill_dir)
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        overflow = []
+
+        while True:
+            if filled < len(view):
+                read = process.stdout.readinto(view[filled:filled + READ_SIZE])
+                filled += read or 0
+            else:
+                # The duration was off (or unknown); keep the rest in chunks
+                read = len(chunk := process.stdout.read(READ_SIZE))
+                overflow.append(chunk)
+            if not read:
+                break
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        returncode = wait_process(process)
+        reader.join()
+        process.stderr.close()
+
+    if returncode != 0:
+        raise ffmpeg.Error("ffmpeg", None, stderr[0] if stderr else b"")
+
+    # A trailing partial sample cannot be decoded, drop it
+    audio = buffer[:filled // 4]
+    if overflow:
+        tail = b"".join(overflow)
+        audio = np.concatenate([audio, np.frombuffer(tail[:len(tail) // 4 * 4], dtype=np.float32)])
+    return audio
@@ -1,7 +1,273 @@
 import os
 import ffmpeg
+import hashlib
 import argparse
-from .utils import filename
+import tempfile
+from typing import Callable, List, Optional
+from .utils import filename, str2bool, write_srt
+from .subtitles import Cues, SubtitleError, load_subtitles
+from .segments import burn_segmented, burn_smart, probe_duration
+from .progress import ProgressTracker, run_ffmpeg, print_progress
+from .encoding import (
+    PROFILES, DEFAULT_PROFILE, FRAGMENTED_MP4, get_profile, video_args, audio_args, probe_audio_codec
+)
+from .languages import is_language_code
+
+
+DEFAULT_STYLE = "OutlineColour=&H40000000,BorderStyle=3"
+
+# "burn" renders the subtitles into the picture, "mux" adds them as a
+# selectable subtitle track and copies the video untouched
+MODES = ("burn", "mux")
+
+# Subtitle codec per output container; MP4 only takes mov_text
+SUBTITLE_CODECS = {".mp4": "mov_text", ".m4v": "mov_text", ".mov": "mov_text", ".mkv": "srt"}
+
+
+def mux_subtitles(video_path: str, srt_path, out_path: str, profile: str = DEFAULT_PROFILE,
+                  on_progress: Optional[Callable] = None, languages: Optional[List[Optional[str]]] = None,
+                  feed: Optional[Callable] = None, on_output: Optional[Callable] = None):
+    """
+    Add an SRT file to a video as a soft subtitle track. Video is stream-copied,
+    audio too when the container allows it, so nothing is re-encoded.
+    srt_path may also be a list of SRT files, which become one track each,
+    tagged with the matching entry of `languages`.
+    With `feed`, the video is read from ffmpeg's stdin; with `on_output`,
+    the result is streamed instead of written to out_path (see burn()).
+    Raises ValueError for containers without a known subtitle codec.
+    """
+    extension = os.path.splitext(out_path)[1].lower()
+    if extension not in SUBTITLE_CODECS:
+        raise ValueError(f"Cannot mux subtitles into {extension or 'this'} files "
+                         f"(expected one of {', '.join(SUBTITLE_CODECS)})")
+
+    srt_paths = [srt_path] if isinstance(srt_path, str) else list(srt_path)
+    video = ffmpeg.input("pipe:0" if feed else video_path)
+    streams = [video.video] + [ffmpeg.input(path) for path in srt_paths]
+    output_args = {"vcodec": "copy", "scodec": SUBTITLE_CODECS[extension]}
+    if on_output is not None:
+        extension = ".mp4"
+        output_args.update(FRAGMENTED_MP4, scodec=SUBTITLE_CODECS[extension])
+    for i, language in enumerate(languages or []):
+        if language:
+            output_args[f"metadata:s:s:{i}"] = f"language={language}"
+
+    audio_codec = probe_audio_codec(video_path)
+    if audio_codec is not None:
+        streams.insert(1, video.audio)
+        if extension == ".mkv":
+            output_args["acodec"] = "copy"
+        else:
+            output_args.update(audio_args(get_profile(profile), audio_codec))
+
+    target = "pipe:1" if on_output else out_path
+    run_ffmpeg(ffmpeg.output(*streams, target, **output_args), on_progress, feed=feed, on_output=on_output)
+
+
+def read_subtitles(srt_path: str) -> Cues:
+    """load_subtitles, with the file name in the error message."""
+    try:
+        return load_subtitles(srt_path)
+    except SubtitleError as e:
+        raise SubtitleError(f"{os.path.basename(srt_path)}: {e}") from None
+
+
+def burn(video_path: str, srt_path: str, out_path: str, style: str = DEFAULT_STYLE,
+         parallel: int = 1, smart: bool = False, profile: str = DEFAULT_PROFILE,
+         threads: Optional[int] = None, mode: str = "burn", progress: Optional[Callable] = None,
+         feed: Optional[Callable] = None, on_output: Optional[Callable] = None,
+         fed: Optional[Callable] = None):
+    """
+    Burn an SRT file into a video and write the result to out_path.
+    With mode="mux" the SRT is added as a soft subtitle track instead and
+    nothing is re-encoded (see mux_subtitles).
+    `profile` names an entry of encoding.PROFILES (x264 preset, CRF, threads,
+    audio passthrough); `threads` overrides its thread count.
+    With parallel > 1 the video is split at keyframes and encoded by that many
+    ffmpeg processes at once (see segments.burn_segmented).
+    With smart=True only the GOPs that carry subtitles are re-encoded and the
+    rest is stream-copied (see segments.burn_smart).
+    `progress(info)` is called about once a second with the percent done,
+    fps, speed and ETA (see progress.ProgressTracker).
+    With `feed`, video_path is still being written (e.g. downloaded) and
+    ffmpeg reads the video from its stdin, which feed(pipe) fills as the file
+    grows (see ingest.GrowingFile). Only the header has to be there; parallel
+    and smart are ignored as they need the whole file. A partial file does
+    not tell its duration reliably (MPEG-TS has none in its header, fragmented
+    MP4 often only that of the fragments already there), so progress is then
+    measured by fed(), the share of the video fed so far, and its percent is
+    None when fed is not given or returns None.
+    With `on_output`, nothing is written to out_path: the video is encoded as
+    fragmented MP4, which plays while it is still being written, and handed
+    to on_output(chunk) as ffmpeg produces it. parallel and smart are
+    ignored then too.
+    The SRT (or WebVTT) file is parsed and validated before ffmpeg starts and
+    handed to ffmpeg normalized, as SRT; for burn, `style` is applied with
+    force_style, so libass renders the same tags and style keys as for any SRT.
+    Raises SubtitleError for invalid subtitles, ffmpeg.Error if ffmpeg fails or stalls.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode} (expected one of {', '.join(MODES)})")
+    cues = read_subtitles(srt_path)
+
+    tracker = None
+    if progress is not None:
+        if feed is None:
+            tracker = ProgressTracker(probe_duration(video_path), progress)
+        else:
+            tracker = ProgressTracker(None, progress, fraction=fed)
+
+    if feed is not None or on_output is not None:
+        parallel, smart = 1, False
+
+    with tempfile.TemporaryDirectory(prefix="burn_srt_") as work_dir:
+        render(video_path, cues, out_path, style, parallel, smart, profile, threads, mode, tracker, work_dir,
+               feed, on_output)
+    if tracker is not None:
+        tracker.finish()
+
+
+def render(video_path: str, cues: Cues, out_path: str, style: str, parallel: int, smart: bool,
+           profile: str, threads: Optional[int], mode: str, tracker: Optional[ProgressTracker], work_dir: str,
+           feed: Optional[Callable] = None, on_output: Optional[Callable] = None):
+    """Pick the render path for burn() and run it."""
+    if mode == "mux":
+        srt_path = os.path.join(work_dir, "subtitles.srt")
+        with open(srt_path, "w", encoding="utf-8") as srt:
+            write_srt(cues, file=srt)
+        mux_subtitles(video_path, srt_path, out_path, profile, tracker.part(tracker.total) if tracker else None,
+                      feed=feed, on_output=on_output)
+        return
+
+    settings = get_profile(profile, threads)
+    if smart and burn_smart(video_path, cues, out_path, style, parallel, settings, tracker):
+        return
+    if parallel > 1 and burn_segmented(video_path, cues, out_path, style, parallel, settings, tracker):
+        return
+
+    video = ffmpeg.input("pipe:0" if feed else video_path)
+
+    streams = [video.video]
+    if len(cues):
+        normalized = os.path.join(work_dir, "subtitles.srt")
+        with open(normalized, "w", encoding="utf-8") as srt:
+            write_srt(cues, file=srt)
+        # Use filename= parameter for subtitles filter on Windows
+        streams = [video.video.filter('subtitles', filename=normalized, force_style=style)]
+    output_args = video_args(settings)
+
+    # Audio is passed through untouched when possible instead of being re-encoded
+    audio_codec = probe_audio_codec(video_path)
+    if audio_codec is not None:
+        streams.append(video.audio)
+        output_args.update(audio_args(settings, audio_codec))
+
+    if on_output is not None:
+        output_args.update(FRAGMENTED_MP4)
+    run_ffmpeg(ffmpeg.output(*streams, "pipe:1" if on_output else out_path, **output_args),
+               tracker.part(tracker.total) if tracker else None, feed=feed, on_output=on_output)
+
+
+def burn_batch(video_path: str, srt_paths: List[str], out_paths: List[str], style: str = DEFAULT_STYLE,
+               profile: str = DEFAULT_PROFILE, threads: Optional[int] = None, mode: str = "burn",
+               languages: Optional[List[Optional[str]]] = None, progress: Optional[Callable] = None):
+    """
+    Render one video with several subtitle files (e.g. one per language) in a
+    single ffmpeg run, so the source is decoded only once.
+
+    With mode="burn", the decoded picture is split into one subtitles filter
+    and encoder per file, and out_paths[i] gets srt_paths[i] burned in.
+    With mode="mux", out_paths holds a single path, which gets every file as
+    its own soft subtitle track, tagged with `languages`.
+    Every file is validated before ffmpeg starts; `progress` is as for burn().
+    Raises SubtitleError for invalid subtitles, ffmpeg.Error if ffmpeg fails or stalls.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode} (expected one of {', '.join(MODES)})")
+    if mode == "burn" and len(out_paths) != len(srt_paths):
+        raise ValueError("burn_batch needs one output path per subtitle file")
+    cues = [read_subtitles(path) for path in srt_paths]
+
+    tracker = None
+    if progress is not None:
+        tracker = ProgressTracker(probe_duration(video_path), progress)
+    on_progress = tracker.part(tracker.total) if tracker else None
+
+    with tempfile.TemporaryDirectory(prefix="burn_srt_") as work_dir:
+        if mode == "mux":
+            normalized = []
+            for i, file_cues in enumerate(cues):
+                normalized.append(os.path.join(work_dir, f"subtitles{i}.srt"))
+                with open(normalized[-1], "w", encoding="utf-8") as srt:
+                    write_srt(file_cues, file=srt)
+            mux_subtitles(video_path, normalized, out_paths[0], profile, on_progress, languages)
+        else:
+            burn_variants(video_path, cues, out_paths, style, get_profile(profile, threads), work_dir, on_progress)
+
+    if tracker is not None:
+        tracker.finish()
+
+
+def burn_variants(video_path: str, cues: List[Cues], out_paths: List[str], style: str, settings: dict,
+                  work_dir: str, on_progress: Optional[Callable] = None):
+    """Decode video_path once and encode one output per set of cues, all in one ffmpeg process."""
+    video = ffmpeg.input(video_path)
+    branches = video.video.split()
+    audio_codec = probe_audio_codec(video_path)
+
+    # The encoders share the cores, unless the profile fixes a thread count
+    threads = settings["threads"] or max(1, (os.cpu_count() or 1) // len(out_paths))
+
+    outputs = []
+    for i, (file_cues, out_path) in enumerate(zip(cues, out_paths)):
+        picture = branches[i]
+        if len(file_cues):
+            normalized = os.path.join(work_dir, f"subtitles{i}.srt")
+            with open(normalized, "w", encoding="utf-8") as srt:
+                write_srt(file_cues, file=srt)
+            picture = picture.filter('subtitles', filename=normalized, force_style=style)
+
+        streams = [picture]
+        output_args = video_args(settings, threads)
+        if audio_codec is not None:
+            streams.append(video.audio)
+            output_args.update(audio_args(settings, audio_codec))
+        outputs.append(ffmpeg.output(*streams, out_path, **output_args))
+
+    run_ffmpeg(ffmpeg.merge_outputs(*outputs), on_progress)
+
+
+def subtitle_language(path: str) -> Optional[str]:
+    """
+    The language tag of a subtitle file named like video.de.srt or video.pt-BR.vtt,
+    or None when the part before the extension is not an ISO 639 code (my.subs.srt).
+    """
+    parts = os.path.basename(path).split(".")
+    if len(parts) >= 3 and is_language_code(parts[-2]):
+        return parts[-2]
+    return None
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def render_key(video_digest: str, srt_digest: str, style: str, *options) -> str:
+    """
+    Content address of a render. Identical inputs and options give the same key,
+    so a finished output can be reused instead of encoding again. `options`
+    are any further settings that change the output (e.g. the profile name).
+    """
+    h = hashlib.sha256()
+    for part in (video_digest, srt_digest, style or "", *map(str, options)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
 
 
 def main():
@@ -10,15 +276,29 @@ def main():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("video", type=str,
                         help="path to video file")
-    parser.add_argument("srt", type=str,
-                        help="path to SRT subtitle file")
+    parser.add_argument("srt", type=str, nargs="+",
+                        help="path to SRT subtitle file; pass several (e.g. one per language) to render them all in one ffmpeg run")
     parser.add_argument("--output_dir", "-o", type=str,
                         default=".", help="directory to save the output video")
     parser.add_argument("--output_name", "-n", type=str,
                         default=None, help="name for output file (without extension)")
     parser.add_argument("--style", type=str,
-                        default="OutlineColour=&H40000000,BorderStyle=3",
+                        default=DEFAULT_STYLE,
                         help="FFmpeg subtitle style override")
+    parser.add_argument("--mode", type=str, default="burn", choices=MODES,
+                        help="burn the subtitles into the picture, or mux them as a soft subtitle track without re-encoding")
+    parser.add_argument("--parallel", "-p", type=int, default=1,
+                        help="split the video at keyframes and encode this many segments at once")
+    parser.add_argument("--smart", type=str2bool, default=False,
+                        help="only re-encode the parts of the video that carry subtitles and copy the rest")
+    parser.add_argument("--profile", type=str, default=DEFAULT_PROFILE, choices=list(PROFILES),
+                        help="encoding profile: x264 preset/CRF and audio passthrough")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="number of encoder threads, overrides the profile when set")
+    parser.add_argument("--progress", type=str2bool, default=True,
+                        help="show a progress bar while encoding")
+    parser.add_argument("--languages", type=str, default=None,
+                        help="comma-separated language of each SRT file, in order; by default taken from names like video.de.srt")
 
     args = parser.parse_args()
 
@@ -27,38 +307,58 @@ def main():
         print(f"Error: Video file not found: {args.video}")
         return
 
-    if not os.path.exists(args.srt):
-        print(f"Error: SRT file not found: {args.srt}")
-        return
+    for srt_path in args.srt:
+        if not os.path.exists(srt_path):
+            print(f"Error: SRT file not found: {srt_path}")
+            return
+
+    languages = [subtitle_language(path) for path in args.srt]
+    if args.languages:
+        languages = [language.strip() or None for language in args.languages.split(",")]
+        if len(languages) != len(args.srt):
+            print(f"Error: Got {len(languages)} languages for {len(args.srt)} SRT files")
+            return
 
     # Create output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
 
-    # Determine output filename
+    # Determine output filename. Muxed MKV inputs stay MKV, since stream-copied
+    # codecs may not fit in MP4
+    extension = ".mp4"
+    if args.mode == "mux" and args.video.lower().endswith(".mkv"):
+        extension = ".mkv"
+
     if args.output_name:
-        output_filename = f"{args.output_name}.mp4"
+        output_filename = f"{args.output_name}{extension}"
     else:
-        output_filename = f"{filename(args.video)}_subtitled.mp4"
+        output_filename = f"{filename(args.video)}_subtitled{extension}"
     
     out_path = os.path.join(args.output_dir, output_filename)
+    out_paths = [out_path]
+    if len(args.srt) > 1 and args.mode == "burn":
+        # One output per SRT file, named after its language (or the SRT file)
+        out_paths = [
+            os.path.join(args.output_dir, f"{os.path.splitext(output_filename)[0]}_{language or filename(srt_path)}{extension}")
+            for srt_path, language in zip(args.srt, languages)
+        ]
 
-    print(f"Adding subtitles from {os.path.basename(args.srt)} to {os.path.basename(args.video)}...")
+    print(f"Adding subtitles from {', '.join(map(os.path.basename, args.srt))} to {os.path.basename(args.video)}...")
 
     try:
-        # Load video and audio
-        video = ffmpeg.input(args.video)
-        audio = video.audio
-
-        # Apply subtitles and combine with audio
-        ffmpeg.concat(
-            video.filter('subtitles', args.srt, force_style=args.style),
-            audio,
-            v=1,
-            a=1
-        ).output(out_path).run(quiet=True, overwrite_output=True)
+        if len(args.srt) > 1:
+            # Decode the video once for all SRT files
+            burn_batch(args.video, args.srt, out_paths, args.style, profile=args.profile, threads=args.threads,
+                       mode=args.mode, languages=languages, progress=print_progress if args.progress else None)
+        else:
+            burn(args.video, args.srt[0], out_path, args.style, parallel=args.parallel, smart=args.smart,
+                 profile=args.profile, threads=args.threads, mode=args.mode,
+                 progress=print_progress if args.progress else None)
 
-        print(f"✓ Successfully created subtitled video: {os.path.abspath(out_path)}")
+        for path in out_paths:
+            print(f"✓ Successfully created subtitled video: {os.path.abspath(path)}")
 
+    except SubtitleError as e:
+        print(f"Error: Invalid subtitle file: {e}")
     except ffmpeg.Error as e:
         print(f"Error: Failed to process video. Make sure ffmpeg is installed.")
         print(f"Details: {e.stderr.decode() if e.stderr else str(e)}")
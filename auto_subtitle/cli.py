@@ -1,19 +1,36 @@
 import os
-import ffmpeg
-import whisper
+import sys
 import argparse
 import warnings
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from .utils import filename, str2bool, write_srt
+from .burn_srt import burn, DEFAULT_STYLE
+from .progress import print_progress
+from .audio import load_audio
+from .transcribe import SILENCE_DB, start_workers, transcribe_chunked, transcribe_stream
+from .transcript_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_MB, cached_transcribe
+from .daemon import DEFAULT_SOCKET, daemon_available, send_job
+from .encoding import PROFILES, DEFAULT_PROFILE
+
+# Kept in sync with whisper.available_models(), so parsing arguments does not
+# have to import whisper (and torch)
+MODELS = ["tiny.en", "tiny", "base.en", "base", "small.en", "small", "medium.en", "medium",
+          "large-v1", "large-v2", "large-v3", "large", "large-v3-turbo", "turbo"]
 
 
 def main():
+    # `auto_subtitle serve` runs the transcription daemon instead
+    if sys.argv[1:2] == ["serve"]:
+        from .daemon import main as serve
+        return serve(sys.argv[2:])
+
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("video", nargs="+", type=str,
                         help="paths to video files to transcribe")
     parser.add_argument("--model", default="small",
-                        choices=whisper.available_models(), help="name of the Whisper model to use")
+                        choices=MODELS, help="name of the Whisper model to use")
     parser.add_argument("--output_dir", "-o", type=str,
                         default=".", help="directory to save the outputs")
     parser.add_argument("--output_srt", type=str2bool, default=False,
@@ -22,6 +39,30 @@ def main():
                         help="only generate the .srt file and not create overlayed video")
     parser.add_argument("--verbose", type=str2bool, default=False,
                         help="whether to print out the progress and debug messages")
+    parser.add_argument("--profile", type=str, default=DEFAULT_PROFILE, choices=list(PROFILES),
+                        help="encoding profile for the subtitled video: x264 preset/CRF and audio passthrough")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="number of encoder threads, overrides the profile when set")
+    parser.add_argument("--spill_after", type=float, default=60,
+                        help="decode the audio of inputs longer than this many minutes into a memory-mapped temp file instead of RAM")
+    parser.add_argument("--chunk_workers", type=int, default=1,
+                        help="split the audio at silences and transcribe the chunks in this many processes, each with its own model")
+    parser.add_argument("--stream", type=str2bool, default=False,
+                        help="write each subtitle to the .srt as soon as its 30 s window is transcribed")
+    parser.add_argument("--silence_db", type=float, default=SILENCE_DB,
+                        help="level (dBFS) below which audio counts as silence and is skipped with --chunk_workers")
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help="directory to cache transcriptions in, so re-running on the same media skips Whisper")
+    parser.add_argument("--cache_size_mb", type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help="disk budget of the transcription cache; least recently used entries are evicted beyond it (0 for unlimited)")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="always transcribe, without reading or writing the transcription cache")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET,
+                        help="Unix socket of a running `auto_subtitle serve` daemon to transcribe with")
+    parser.add_argument("--no_daemon", action="store_true",
+                        help="always load the model in this process, even if a daemon is running")
+    parser.add_argument("--workers", "-j", type=int, default=min(4, os.cpu_count() or 1),
+                        help="number of ffmpeg jobs (audio extraction and burning) to run alongside transcription")
 
     parser.add_argument("--task", type=str, default="transcribe", choices=[
                         "transcribe", "translate"], help="whether to perform X->X speech recognition ('transcribe') or X->English translation ('translate')")
@@ -34,6 +75,18 @@ def main():
     output_srt: bool = args.pop("output_srt")
     srt_only: bool = args.pop("srt_only")
     language: str = args.pop("language")
+    profile: str = args.pop("profile")
+    threads: int = args.pop("threads")
+    workers: int = args.pop("workers")
+    spill_after: float = args.pop("spill_after")
+    chunk_workers: int = args.pop("chunk_workers")
+    silence_db: float = args.pop("silence_db")
+    stream: bool = args.pop("stream")
+    cache_dir: str = args.pop("cache_dir")
+    cache_size_mb: int = args.pop("cache_size_mb")
+    no_cache: bool = args.pop("no_cache")
+    socket_path: str = args.pop("socket")
+    no_daemon: bool = args.pop("no_daemon")
     
     os.makedirs(output_dir, exist_ok=True)
 
@@ -45,70 +98,134 @@ def main():
     elif language != "auto":
         args["language"] = language
         
-    model = whisper.load_model(model_name)
-    audios = get_audio(args.pop("video"))
-    subtitles = get_subtitles(
-        audios, output_srt or srt_only, output_dir, lambda audio_path: model.transcribe(audio_path, **args)
-    )
-
-    if srt_only:
-        return
-
-    for path, srt_path in subtitles.items():
+    pool = None
+    if chunk_workers > 1:
+        pool = start_workers(model_name, chunk_workers)
+        run_model = None
+    elif not no_daemon and daemon_available(socket_path):
+        # The daemon keeps the model loaded, so there is nothing to load here
+        print(f"Transcribing with the daemon at {socket_path}")
+        run_model = lambda audio, **options: send_job(socket_path, audio, model_name, options)
+    else:
+        models = []
+
+        def run_model(audio, **options):
+            # Loaded on first use, so a run served from the cache never imports whisper
+            if not models:
+                import whisper
+                models.append(whisper.load_model(model_name))
+            return models[0].transcribe(audio, **options)
+
+    if pool is not None:
+        transcribe = lambda audio: transcribe_chunked(pool, audio, chunk_workers, silence_db, **args)
+    elif stream:
+        transcribe = lambda audio: {"segments": transcribe_stream(run_model, audio, silence_db, **args)}
+    else:
+        transcribe = lambda audio: run_model(audio, **args)
+
+    videos = args.pop("video")
+    if not no_cache:
+        # Everything that changes the transcription goes into the cache key
+        options = {"model": model_name, **{k: v for k, v in args.items() if k != "verbose"}}
+        if chunk_workers > 1:
+            options.update(chunk_workers=chunk_workers, silence_db=silence_db)
+        elif stream:
+            options.update(stream=True, silence_db=silence_db)
+        transcribe = cached_transcribe(transcribe, cache_dir, options, cache_size_mb * 1024 * 1024)
+
+    # The progress bar redraws itself with \r, which only makes sense on a terminal
+    show_progress = sys.stderr.isatty()
+
+    def render(path, srt_path):
         out_path = os.path.join(output_dir, f"{filename(path)}.mp4")
 
         print(f"Adding subtitles to {filename(path)}...")
 
-        video = ffmpeg.input(path)
-        audio = video.audio
-
-        ffmpeg.concat(
-            video.filter('subtitles', srt_path, force_style="OutlineColour=&H40000000,BorderStyle=3"), audio, v=1, a=1
-        ).output(out_path).run(quiet=True, overwrite_output=True)
+        progress = (lambda info: print_progress(info, f"{filename(path)} ")) if show_progress else None
+        burn(path, srt_path, out_path, DEFAULT_STYLE, profile=profile, threads=threads, progress=progress)
 
         print(f"Saved subtitled video to {os.path.abspath(out_path)}.")
 
-
-def get_audio(paths):
-    temp_dir = tempfile.gettempdir()
-
-    audio_paths = {}
-
-    for path in paths:
-        print(f"Extracting audio from {filename(path)}...")
-        output_path = os.path.join(temp_dir, f"{filename(path)}.wav")
-
-        ffmpeg.input(path).output(
-            output_path,
-            acodec="pcm_s16le", ac=1, ar="16k"
-        ).run(quiet=True, overwrite_output=True)
-
-        audio_paths[path] = output_path
-
-    return audio_paths
-
-
-def get_subtitles(audio_paths: list, output_srt: bool, output_dir: str, transcribe: callable):
-    subtitles_path = {}
-
-    for path, audio_path in audio_paths.items():
-        srt_path = output_dir if output_srt else tempfile.gettempdir()
-        srt_path = os.path.join(srt_path, f"{filename(path)}.srt")
-        
-        print(
-            f"Generating subtitles for {filename(path)}... This might take a while."
+    try:
+        run_pipeline(
+            videos, output_srt or srt_only, output_dir, transcribe,
+            None if srt_only else render, workers, spill_after * 60
         )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def run_pipeline(paths: list, output_srt: bool, output_dir: str, transcribe: callable,
+                 render: callable = None, workers: int = 1, spill_after: float = None):
+    """
+    Subtitle a batch of videos with the three stages overlapped: audio extraction
+    and burning run in a pool of `workers` while the caller's thread transcribes
+    each audio as soon as it is ready. Whisper is not thread-safe and is the
+    expensive stage, so it stays on one thread and is never left waiting on
+    ffmpeg once the first audio is out.
+
+    Audio is decoded straight into memory (see audio.load_audio) and at most
+    `workers` extractions run ahead of transcription, so decoded audio does
+    not pile up. They get their own pool, so a queue of long burns
+    never holds up the audio Whisper needs next. `render(path, srt_path)` is
+    skipped when None.
+    """
+    workers = max(1, workers)
+    pending = list(paths)
+    extracting = []
+    renders = []
+
+    # ffmpeg does the work in its own process, so threads are enough here
+    with ThreadPoolExecutor(max_workers=workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=workers) as render_pool:
+
+        def extract_next():
+            if pending:
+                path = pending.pop(0)
+                extracting.append((path, extract_pool.submit(extract_audio, path, spill_after)))
+
+        for _ in range(workers):
+            extract_next()
+
+        while extracting:
+            path, future = extracting.pop(0)
+            audio = future.result()
+            extract_next()
+
+            srt_path = transcribe_to_srt(path, audio, output_srt, output_dir, transcribe)
+            if render is not None:
+                renders.append(render_pool.submit(render, path, srt_path))
+
+        for future in renders:
+            future.result()
+
+
+def extract_audio(path: str, spill_after: float = None):
+    """Decode the audio of a video for Whisper (16 kHz mono float32 array)."""
+    print(f"Extracting audio from {filename(path)}...")
+    return load_audio(path, spill_after=spill_after)
+
+
+def transcribe_to_srt(path: str, audio, output_srt: bool, output_dir: str,
+                      transcribe: callable) -> str:
+    """Transcribe the audio of one video and write the SRT next to the outputs or in the temp dir."""
+    srt_path = output_dir if output_srt else tempfile.gettempdir()
+    srt_path = os.path.join(srt_path, f"{filename(path)}.srt")
+
+    print(
+        f"Generating subtitles for {filename(path)}... This might take a while."
+    )
 
-        warnings.filterwarnings("ignore")
-        result = transcribe(audio_path)
-        warnings.filterwarnings("default")
-
-        with open(srt_path, "w", encoding="utf-8") as srt:
-            write_srt(result["segments"], file=srt)
+    warnings.filterwarnings("ignore")
+    result = transcribe(audio)
+    warnings.filterwarnings("default")
 
-        subtitles_path[path] = srt_path
+    # Streamed segments are flushed one by one, so the SRT fills up while decoding runs
+    with open(srt_path, "w", encoding="utf-8") as srt:
+        write_srt(result["segments"], file=srt, flush=not isinstance(result["segments"], list))
 
-    return subtitles_path
+    return srt_path
 
 
 if __name__ == '__main__':
@@ -0,0 +1,158 @@
+import os
+import json
+import socket
+import signal
+import argparse
+import tempfile
+import threading
+import socketserver
+import numpy as np
+from .utils import json_default
+
+
+# Where `auto_subtitle serve` listens and the CLI looks for it
+DEFAULT_SOCKET = os.getenv("AUTO_SUBTITLE_SOCKET") or os.path.join(
+    os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+    f"auto_subtitle-{os.getuid() if hasattr(os, 'getuid') else 'user'}.sock"
+)
+
+
+# Protocol: the client sends one JSON line ({"model", "options", "samples"})
+# followed by the samples as raw float32, and gets one JSON line back: the
+# transcribe() result, or {"error": message}.
+
+def send_message(stream, message: dict):
+    stream.write(json.dumps(message, default=json_default).encode("utf-8") + b"\n")
+
+
+def read_message(stream) -> dict:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by the other side")
+    return json.loads(line)
+
+
+def daemon_available(socket_path: str = DEFAULT_SOCKET) -> bool:
+    """Whether a daemon is accepting connections on socket_path."""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return False
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def send_job(socket_path: str, audio: np.ndarray, model_name: str, options: dict) -> dict:
+    """
+    Transcribe 16 kHz mono float32 audio with a model resident in the daemon.
+    Raises RuntimeError if the daemon reports an error.
+    """
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as stream:
+            send_message(stream, {"model": model_name, "options": options, "samples": len(audio)})
+            stream.write(memoryview(audio).cast("B"))
+            stream.flush()
+            result = read_message(stream)
+
+    if "error" in result:
+        raise RuntimeError(f"Transcription daemon failed: {result['error']}")
+    return result
+
+
+class TranscriptionHandler(socketserver.StreamRequestHandler):
+    """Serves one job per connection with the server's resident models."""
+
+    def handle(self):
+        try:
+            job = read_message(self.rfile)
+            audio = np.empty(job["samples"], dtype=np.float32)
+            view = memoryview(audio).cast("B")
+            filled = 0
+            while filled < len(view):
+                read = self.rfile.readinto(view[filled:])
+                if not read:
+                    raise ConnectionError("Connection closed before all samples arrived")
+                filled += read
+
+            model, lock = self.server.get_model(job["model"])
+            # A model is not thread-safe; different models can run side by side
+            with lock:
+                result = model.transcribe(audio, **job.get("options", {}))
+        except Exception as e:
+            result = {"error": str(e)}
+
+        try:
+            send_message(self.wfile, result)
+        except OSError:
+            pass
+
+
+class TranscriptionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server keeping Whisper models loaded between jobs."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        self.models = {}
+        self.models_lock = threading.Lock()
+        super().__init__(socket_path, TranscriptionHandler)
+
+    def get_model(self, model_name: str):
+        """The resident (model, lock) pair for model_name, loading it on first use."""
+        with self.models_lock:
+            if model_name not in self.models:
+                import whisper
+
+                print(f"Loading model {model_name}...")
+                self.models[model_name] = (whisper.load_model(model_name), threading.Lock())
+            return self.models[model_name]
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, models: list = ()):
+    """Preload `models` and serve transcription jobs on socket_path until interrupted."""
+    if daemon_available(socket_path):
+        raise RuntimeError(f"A daemon is already listening on {socket_path}")
+    if os.path.exists(socket_path):
+        # Left behind by a daemon that did not shut down cleanly
+        os.remove(socket_path)
+
+    server = TranscriptionServer(socket_path)
+    # Stop cleanly on SIGTERM too; shutdown() must not run on the serving thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        os.chmod(socket_path, 0o600)
+        for model_name in models:
+            server.get_model(model_name)
+
+        print(f"Listening on {socket_path}")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="auto_subtitle serve",
+        description="Keep Whisper models loaded and transcribe for auto_subtitle over a Unix socket",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET,
+                        help="path of the Unix socket to listen on")
+    parser.add_argument("--model", action="append", default=None,
+                        help="model to load at startup (repeat for several); others are loaded on first use")
+
+    args = parser.parse_args(argv)
+
+    try:
+        serve(args.socket, args.model or ["small"])
+    except RuntimeError as e:
+        print(f"Error: {e}")
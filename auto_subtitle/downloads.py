@@ -0,0 +1,145 @@
+import os
+import asyncio
+from pathlib import Path
+from email.utils import formatdate
+from urllib.parse import quote
+from typing import Optional, Tuple
+from starlette.responses import Response
+
+
+# Bytes read from disk and sent at a time when the server cannot send files itself
+CHUNK_SIZE = 1024 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    """A Range header that selects no bytes of the file."""
+
+
+def output_etag(key: str, stat: os.stat_result) -> str:
+    """
+    Strong ETag of an output: its render key (the content address of the
+    inputs and options) plus its modification time, which changes if the
+    output is evicted and rendered again.
+    """
+    return f'"{key}-{stat.st_mtime_ns:x}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists etag (weak comparison, as RFC 9110 asks for it)."""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    The first and last byte selected by a Range header, or None to send the
+    whole file: without a header, for units other than bytes, for headers
+    that cannot be read and for multiple ranges, which are rarely used and
+    may be answered in full. Raises RangeNotSatisfiable when no byte is selected.
+    """
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    specs = header.strip()[6:].split(",")
+    if len(specs) != 1:
+        return None
+
+    first, _, last = (part.strip() for part in specs[0].partition("-"))
+    if (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+
+    if not first:
+        # A suffix: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - int(last)), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+class FileRangeResponse(Response):
+    """
+    Sends the bytes [start, end] of a file. Uses the ASGI zero-copy send
+    extension (sendfile) when the server offers it, and reads the file in
+    chunks on a worker thread otherwise. HEAD requests get the headers only.
+    """
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int = 200, headers: Optional[dict] = None,
+                 media_type: Optional[str] = None, send_body: bool = True):
+        headers = dict(headers or {}, **{"content-length": str(end - start + 1)})
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_body = send_body
+
+    async def __call__(self, scope, receive, send):
+        if not self.send_body or self.end < self.start:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        count = self.end - self.start + 1
+        loop = asyncio.get_running_loop()
+        with open(self.path, "rb") as f:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.start, "count": count})
+                return
+
+            f.seek(self.start)
+            while count > 0:
+                chunk = await loop.run_in_executor(None, f.read, min(CHUNK_SIZE, count))
+                if not chunk:
+                    # The file shrank while it was being sent
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+            if count > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+
+def file_response(path: Path, stat: os.stat_result, etag: str, filename: str, request_headers, method: str,
+                  media_type: str = "video/mp4") -> Response:
+    """
+    Answer a GET or HEAD for a file with conditional and byte-range support:
+    304 when If-None-Match lists etag, 206 for a satisfiable Range (unless
+    If-Range names another version), 416 for one that is not, 200 otherwise.
+    """
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        "accept-ranges": "bytes",
+        "content-disposition": content_disposition(filename),
+    }
+    if etag_matches(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"etag": etag, "last-modified": headers["last-modified"]})
+
+    size = stat.st_size
+    send_body = method != "HEAD"
+    if_range = request_headers.get("if-range")
+    try:
+        selected = None
+        if not if_range or if_range.strip() in (etag, headers["last-modified"]):
+            selected = parse_range(request_headers.get("range"), size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={"content-range": f"bytes */{size}", "etag": etag})
+
+    if selected is None:
+        return FileRangeResponse(path, 0, size - 1, 200, headers, media_type, send_body)
+    start, end = selected
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(path, start, end, 206, headers, media_type, send_body)
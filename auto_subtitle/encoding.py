@@ -0,0 +1,61 @@
+import ffmpeg
+from typing import Optional
+
+
+# Named encoding profiles. Burning subtitles never changes the audio, so every
+# profile copies it when the output container can hold it.
+PROFILES = {
+    "fast": {"preset": "veryfast", "crf": 23, "threads": 0, "copy_audio": True},
+    "balanced": {"preset": "medium", "crf": 23, "threads": 0, "copy_audio": True},
+    "archive": {"preset": "slow", "crf": 18, "threads": 0, "copy_audio": True},
+}
+DEFAULT_PROFILE = "balanced"
+
+# Output arguments for an MP4 written front to back in fragments, which can
+# be sent and played while it is still being encoded
+FRAGMENTED_MP4 = {"f": "mp4", "movflags": "frag_keyframe+empty_moov"}
+
+# Audio codecs that can be stream-copied into an MP4 output. FLAC is left
+# out: FFmpeg before 6.0 only muxes it into MP4 with -strict experimental.
+MP4_AUDIO_CODECS = {"aac", "mp3", "ac3", "eac3", "alac", "opus"}
+
+
+def get_profile(name: Optional[str] = None, threads: Optional[int] = None) -> dict:
+    """
+    Look up an encoding profile by name, optionally overriding its thread count
+    (0 lets x264 pick). Raises ValueError for unknown profiles.
+    """
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoding profile: {name} (expected one of {', '.join(PROFILES)})")
+
+    profile = dict(PROFILES[name])
+    if threads is not None:
+        profile["threads"] = threads
+    return profile
+
+
+def video_args(profile: dict, threads: Optional[int] = None) -> dict:
+    """ffmpeg output arguments for the video stream of a profile."""
+    return {
+        "vcodec": "libx264",
+        "preset": profile["preset"],
+        "crf": profile["crf"],
+        "threads": profile["threads"] if threads is None else threads,
+    }
+
+
+def probe_audio_codec(video_path: str) -> Optional[str]:
+    """Codec name of the first audio stream, or None if there is no audio."""
+    streams = ffmpeg.probe(video_path, select_streams="a:0").get("streams", [])
+    return streams[0].get("codec_name") if streams else None
+
+
+def audio_args(profile: dict, audio_codec: Optional[str]) -> dict:
+    """
+    ffmpeg output arguments for the audio stream: copy it when the profile
+    allows and MP4 supports the codec, otherwise encode to AAC.
+    """
+    if profile["copy_audio"] and audio_codec in MP4_AUDIO_CODECS:
+        return {"acodec": "copy"}
+    return {"acodec": "aac"}
@@ -0,0 +1,116 @@
+import struct
+import threading
+from typing import BinaryIO, Optional
+
+
+# Bytes of a video that are enough to tell its container apart (see streamable)
+HEAD_BYTES = 1024 * 1024
+
+# Bytes copied from the file to ffmpeg at a time
+FEED_CHUNK_SIZE = 256 * 1024
+
+
+def streamable(head: bytes) -> bool:
+    """
+    Whether a video can be read front to back from a pipe, judged from its
+    first bytes: Matroska/WebM, MPEG-TS and fragmented MP4 can; an MP4 whose
+    moov atom comes after the media data (or is not fragmented) needs seeking.
+    """
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return True
+    if len(head) > 376 and head[0] == head[188] == head[376] == 0x47:
+        return True
+    return mp4_fragmented(head)
+
+
+def mp4_fragmented(head: bytes) -> bool:
+    """Whether the top-level boxes of an MP4 start with a moov describing fragments (mvex)."""
+    offset = 0
+    while offset + 8 <= len(head):
+        size, kind = struct.unpack(">I4s", head[offset:offset + 8])
+        header = 8
+        if size == 1:
+            # 64-bit size
+            if offset + 16 > len(head):
+                return False
+            size = struct.unpack(">Q", head[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            # The box runs to the end of the file
+            size = len(head) - offset
+
+        if kind == b"moov":
+            return b"mvex" in head[offset + header:offset + size]
+        if kind in (b"mdat", b"moof"):
+            # Media data before the moov: it is at the end of the file
+            return False
+        if size < header:
+            return False
+        offset += size
+    return False
+
+
+class GrowingFile:
+    """
+    A file that is still being written, e.g. by a download, read as a stream
+    that waits for more data at its end until the writer is done.
+
+    The writer calls grow(size) after each write and finish() once the file
+    is complete (or will never be); feed(pipe) copies it to a pipe as it grows.
+    `expected` is the final size, when the writer knows it in advance (e.g.
+    from a Content-Length), for fraction().
+    """
+
+    def __init__(self, path: str, expected: Optional[int] = None):
+        self.path = path
+        self.expected = expected
+        self.size = 0
+        self.fed = 0
+        self.done = False
+        self.condition = threading.Condition()
+
+    def grow(self, size: int):
+        with self.condition:
+            self.size = size
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.done = True
+            if self.expected is None:
+                self.expected = self.size
+            self.condition.notify_all()
+
+    def fraction(self) -> Optional[float]:
+        """Share of the file fed to the pipe so far, or None while its final size is unknown."""
+        if not self.expected:
+            return None
+        return min(self.fed / self.expected, 1.0)
+
+    def feed(self, pipe: BinaryIO):
+        """Copy the file to pipe as it is written, then close the pipe. Blocks, so run it on its own thread."""
+        offset = 0
+        try:
+            with open(self.path, "rb") as f:
+                while True:
+                    with self.condition:
+                        while self.size <= offset and not self.done:
+                            self.condition.wait()
+                        available = self.size
+                    if available <= offset:
+                        return
+                    while offset < available:
+                        chunk = f.read(min(FEED_CHUNK_SIZE, available - offset))
+                        if not chunk:
+                            return
+                        pipe.write(chunk)
+                        offset += len(chunk)
+                        self.fed = offset
+        except (BrokenPipeError, ValueError):
+            # ffmpeg exited (or was killed) before reading everything; run_ffmpeg reports why
+            pass
+        finally:
+            try:
+                pipe.close()
+            except OSError:
+                pass
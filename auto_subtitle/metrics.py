@@ -0,0 +1,264 @@
+import os
+import sys
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Tuple
+
+
+# Metrics of this process in the Prometheus text format (version 0.0.4).
+# Each metric is a module-level object registered in REGISTRY; render()
+# writes them all out for GET /metrics.
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Upper bounds of the histogram buckets, in seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+REGISTRY = []
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    """A named metric with a fixed set of label names, one value per label combination."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # Metrics without labels are exported as zero until first updated
+        self.values = {} if self.labels else {(): self.zero()}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def zero(self):
+        """Initial value of a label combination."""
+        return 0
+
+    def key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """(suffix, label names, label values, value) for every exported line."""
+        with self.lock:
+            return [("", self.labels, key, value) for key, value in sorted(self.values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(names, values)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        key = self.key(labels)
+        with self.lock:
+            return self.values.get(key, 0)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, help, labels)
+
+    def zero(self):
+        return [0] * len(self.buckets), 0.0
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key) or self.zero()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block took, in seconds, whether or not it raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        names = self.labels + ("le",)
+        lines = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(("_bucket", names, key + (format_value(bound),), count))
+                lines.append(("_sum", self.labels, key, total))
+                lines.append(("_count", self.labels, key, counts[-1]))
+        return lines
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text format."""
+    return "".join(metric.render() for metric in REGISTRY)
+
+
+# ffmpeg processes, recorded by every caller that runs one (see wait_process)
+
+FFMPEG_ACTIVE = Gauge("auto_subtitle_ffmpeg_processes", "ffmpeg processes running right now")
+FFMPEG_PROCESSES = Counter(
+    "auto_subtitle_ffmpeg_processes_total", "ffmpeg processes that exited, by outcome", ("outcome",)
+)
+FFMPEG_CPU = Counter(
+    "auto_subtitle_ffmpeg_cpu_seconds_total", "CPU time used by ffmpeg processes that exited", ("mode",)
+)
+FFMPEG_PEAK_RSS = Histogram(
+    "auto_subtitle_ffmpeg_peak_rss_bytes", "Peak resident memory of each ffmpeg process",
+    buckets=[2 ** power * 1024 * 1024 for power in range(4, 14)]
+)
+
+
+def wait_process(process) -> int:
+    """
+    Wait for a subprocess.Popen and return its exit code, like process.wait(),
+    recording the CPU time and peak memory of the process where the OS
+    reports them (wait4, on Unix).
+    """
+    usage = None
+    if hasattr(os, "wait4") and process.returncode is None:
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            # Reaped elsewhere
+            pass
+
+    returncode = process.wait()
+    FFMPEG_PROCESSES.inc(outcome="ok" if returncode == 0 else "failed")
+    if usage is not None:
+        FFMPEG_CPU.inc(usage.ru_utime, mode="user")
+        FFMPEG_CPU.inc(usage.ru_stime, mode="system")
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        FFMPEG_PEAK_RSS.observe(usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024))
+    return returncode
+
+
+# API requests, recorded by RequestMetricsMiddleware and the request handlers
+
+REQUEST_SECONDS = Histogram(
+    "auto_subtitle_request_seconds", "Time from receiving a request to sending the last byte of its response",
+    ("method", "endpoint", "status")
+)
+RESPONSE_BYTES = Counter("auto_subtitle_response_bytes_total", "Response body bytes sent", ("endpoint",))
+STAGE_SECONDS = Histogram(
+    "auto_subtitle_stage_seconds",
+    "Time spent in each stage of the pipeline (upload, download, disk_write, queue, encode, decode_audio, transcribe)",
+    ("stage",)
+)
+INPUT_BYTES = Counter("auto_subtitle_input_bytes_total", "Bytes of input files received", ("source",))
+OUTPUT_BYTES = Counter("auto_subtitle_output_bytes_total", "Bytes of rendered videos written", ("mode",))
+REALTIME_FACTOR = Histogram(
+    "auto_subtitle_encode_realtime_factor", "Seconds of video rendered per second of encode time", ("mode",),
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+ENCODE_QUEUE = Gauge("auto_subtitle_encode_queue_depth", "Encodes waiting for a free encode worker")
+ENCODES_RUNNING = Gauge("auto_subtitle_encodes_running", "Encodes running on the encode workers")
+TRANSCRIPTIONS_RUNNING = Gauge(
+    "auto_subtitle_transcriptions_running", "Model replicas busy transcribing", ("model",)
+)
+ADMITTED_JOBS = Gauge(
+    "auto_subtitle_admitted_jobs", "Encode requests and background jobs admitted and not finished (see admission)"
+)
+REJECTED_REQUESTS = Counter(
+    "auto_subtitle_rejected_requests_total", "Requests turned away by admission control, by reason (capacity, disk, memory, size)",
+    ("reason",)
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing every request until its last body byte is sent,
+    so streamed and file responses are measured in full. Requests are
+    labelled with their route template (/download/{job_id}), not the raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        def endpoint() -> str:
+            route = scope.get("route")
+            return getattr(route, "path", "unmatched")
+
+        async def send_and_measure(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                RESPONSE_BYTES.inc(len(message.get("body", b"")), endpoint=endpoint())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], endpoint=endpoint(), status=status[0]
+            )
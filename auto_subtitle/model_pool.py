@@ -0,0 +1,89 @@
+import asyncio
+from functools import partial
+from typing import AsyncIterator, List
+from concurrent.futures import ThreadPoolExecutor
+from .transcribe import transcribe_stream
+
+
+class ModelPool:
+    """
+    Whisper models loaded once and shared by all requests of a process.
+
+    Each model is loaded `replicas` times. A transcription borrows one replica
+    for as long as it runs, so the replica count is the model's concurrency
+    limit: further requests wait for a replica instead of loading the model
+    again or sharing one that is not thread-safe. Transcriptions run on the
+    pool's own threads (torch releases the GIL), never on the event loop.
+    """
+
+    def __init__(self, model_names: List[str], replicas: int = 1):
+        self.model_names = list(model_names)
+        self.replicas = max(1, replicas)
+        self.idle = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.model_names) * self.replicas), thread_name_prefix="whisper"
+        )
+
+    async def load(self):
+        """Load every replica of every model. Raises ImportError if whisper is not installed."""
+        import whisper
+
+        loop = asyncio.get_running_loop()
+        for name in self.model_names:
+            print(f"Loading Whisper model {name} ({self.replicas}x)...")
+            replicas = asyncio.Queue()
+            for _ in range(self.replicas):
+                replicas.put_nowait(await loop.run_in_executor(self.executor, whisper.load_model, name))
+            self.idle[name] = replicas
+
+    def __contains__(self, model_name: str) -> bool:
+        return model_name in self.idle
+
+    def busy(self, model_name: str) -> int:
+        """Replicas of model_name that are busy right now."""
+        return self.replicas - self.idle[model_name].qsize()
+
+    async def transcribe(self, model_name: str, audio, **options) -> dict:
+        """Transcribe audio with a free replica of model_name, waiting for one if all are busy."""
+        replicas = self.idle[model_name]
+        model = await replicas.get()
+        work = None
+        try:
+            loop = asyncio.get_running_loop()
+            work = loop.run_in_executor(self.executor, partial(model.transcribe, audio, **options))
+            return await asyncio.shield(work)
+        finally:
+            # A request cancelled mid-transcription keeps the replica until the thread is done with it
+            if work is not None and not work.done():
+                work.add_done_callback(lambda _: replicas.put_nowait(model))
+            else:
+                replicas.put_nowait(model)
+
+    async def transcribe_stream(self, model_name: str, audio, **options) -> AsyncIterator[dict]:
+        """
+        Yield segments as each window is transcribed (see transcribe.transcribe_stream).
+        The replica is held until the stream ends or is closed.
+        """
+        replicas = self.idle[model_name]
+        model = await replicas.get()
+        step = None
+        try:
+            loop = asyncio.get_running_loop()
+            segments = transcribe_stream(model.transcribe, audio, **options)
+            done = object()
+            while True:
+                # Each step transcribes at most one window on the pool's threads
+                step = loop.run_in_executor(self.executor, next, segments, done)
+                segment = await asyncio.shield(step)
+                if segment is done:
+                    break
+                yield segment
+        finally:
+            # A step still running when the stream is closed keeps the replica until it ends
+            if step is not None and not step.done():
+                step.add_done_callback(lambda _: replicas.put_nowait(model))
+            else:
+                replicas.put_nowait(model)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,250 @@
+import os
+import sys
+import time
+import queue
+import ffmpeg
+import threading
+import subprocess
+from typing import Callable, Optional
+from .metrics import FFMPEG_ACTIVE, wait_process
+
+
+# An encode whose output position has not moved for this long (seconds) is
+# considered stuck and killed
+STALL_TIMEOUT = float(os.environ.get("FFMPEG_STALL_TIMEOUT", 300))
+
+# Bytes of output read from ffmpeg's stdout at a time
+OUTPUT_CHUNK_SIZE = 256 * 1024
+
+
+class FFmpegStalled(ffmpeg.Error):
+    """Raised when an ffmpeg process stops making progress and is killed."""
+
+    def __init__(self, cmd, stall_timeout: float, stderr: bytes = b""):
+        message = f"ffmpeg made no progress for {stall_timeout:.0f} seconds and was killed\n".encode()
+        super().__init__(cmd, None, message + (stderr or b""))
+
+
+def run_ffmpeg(stream, on_progress: Optional[Callable] = None, stall_timeout: Optional[float] = None,
+               feed: Optional[Callable] = None, on_output: Optional[Callable] = None):
+    """
+    Run an ffmpeg-python stream like .run(quiet=True, overwrite_output=True),
+    but with `-progress` written to a pipe and parsed while it runs.
+
+    Every progress block calls on_progress(out_time, fps, speed): seconds of
+    output written so far, frames per second and speed as a multiple of
+    realtime. If the output position stops moving for stall_timeout seconds,
+    (default: STALL_TIMEOUT) the process is killed and FFmpegStalled is raised.
+    For a stream reading "pipe:0", feed(pipe) writes the input to ffmpeg's
+    stdin on its own thread and closes it when done (see ingest.GrowingFile).
+    For a stream writing to "pipe:1", on_output(chunk) is called with the
+    output as ffmpeg writes it (progress then goes through a pipe of its
+    own); if it raises, ffmpeg is killed.
+    Raises ffmpeg.Error if ffmpeg fails.
+    """
+    stall_timeout = stall_timeout or STALL_TIMEOUT
+    progress_fd = None
+    if on_output is not None:
+        progress_read, progress_fd = os.pipe()
+    args = stream.global_args("-progress", f"pipe:{progress_fd or 1}", "-nostats").compile(overwrite_output=True)
+    try:
+        process = subprocess.Popen(
+            args, stdin=subprocess.PIPE if feed else subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, pass_fds=(progress_fd,) if progress_fd else ()
+        )
+    finally:
+        if progress_fd is not None:
+            os.close(progress_fd)
+    progress = os.fdopen(progress_read, "rb") if progress_fd is not None else process.stdout
+    FFMPEG_ACTIVE.inc()
+    if feed is not None:
+        # Not joined: it may be waiting for input that ffmpeg no longer needs
+        threading.Thread(target=feed, args=(process.stdin,), daemon=True).start()
+
+    # Both pipes are drained on their own threads, so neither can fill up and
+    # block ffmpeg while the other is waited on
+    lines = queue.Queue()
+    stderr = []
+
+    def read_progress():
+        for line in progress:
+            lines.put(line)
+
+    def read_output():
+        try:
+            for chunk in iter(lambda: process.stdout.read1(OUTPUT_CHUNK_SIZE), b""):
+                on_output(chunk)
+        except Exception:
+            # Nobody takes the output any more (e.g. the client went away)
+            process.kill()
+
+    readers = [
+        threading.Thread(target=read_progress, daemon=True),
+        threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True),
+    ]
+    if on_output is not None:
+        readers.append(threading.Thread(target=read_output, daemon=True))
+    for reader in readers:
+        reader.start()
+
+    block = {}
+    out_time = -1.0
+    last_move = time.monotonic()
+    ended = False
+    stalled = False
+    exited = False
+    try:
+        while readers[0].is_alive() or not lines.empty():
+            try:
+                line = lines.get(timeout=1.0)
+            except queue.Empty:
+                line = None
+
+            if line is not None:
+                key, _, value = line.decode("utf-8", "replace").strip().partition("=")
+                block[key] = value
+                if key == "progress":
+                    # A block is complete ("progress=continue" or "progress=end")
+                    position = parse_out_time(block)
+                    if position > out_time:
+                        out_time = position
+                        last_move = time.monotonic()
+                    if on_progress is not None:
+                        on_progress(max(out_time, 0.0), parse_float(block.get("fps")),
+                                    parse_float(block.get("speed", "").rstrip("x")))
+                    ended = value == "end"
+                    block = {}
+
+            # Checked on every line as well: a stuck ffmpeg may keep reporting
+            # the same position. One that has finished is only exiting.
+            if not ended and readers[0].is_alive() and time.monotonic() - last_move > stall_timeout:
+                stalled = True
+                break
+        # stdout is closed, so ffmpeg is exiting on its own
+        exited = not stalled
+    finally:
+        if not exited:
+            process.kill()
+        wait_process(process)
+        FFMPEG_ACTIVE.dec()
+        for reader in readers:
+            reader.join()
+        progress.close()
+        process.stdout.close()
+        process.stderr.close()
+
+    if stalled:
+        raise FFmpegStalled(args, stall_timeout, stderr[0] if stderr else b"")
+    if process.returncode != 0:
+        raise ffmpeg.Error("ffmpeg", None, stderr[0] if stderr else b"")
+
+
+def parse_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_out_time(block: dict) -> float:
+    """Output position in seconds of a -progress block (out_time_ms is in microseconds too)."""
+    for key in ("out_time_us", "out_time_ms"):
+        value = block.get(key)
+        if value and value.lstrip("-").isdigit():
+            return int(value) / 1_000_000
+    return -1.0
+
+
+class ProgressTracker:
+    """
+    Combines the progress of the ffmpeg processes working on one render into
+    percent, fps, speed and ETA, and reports it to callback(info) at most
+    once per min_interval seconds (and always at 100%).
+
+    Each process reports through its own part(seconds) callback, where
+    seconds is the share of `total` it renders.
+
+    Without a total (e.g. a video read from a pipe while it downloads, whose
+    duration is not known yet), percent and ETA come from fraction(), the
+    share of the input read so far, and are None while it returns None.
+    """
+
+    def __init__(self, total: Optional[float], callback: Callable, min_interval: float = 1.0,
+                 fraction: Optional[Callable] = None):
+        self.total = max(total, 1e-6) if total is not None else None
+        self.fraction = fraction
+        self.callback = callback
+        self.min_interval = min_interval
+        self.started = time.monotonic()
+        self.reported = 0.0
+        self.parts = {}
+        self.lock = threading.Lock()
+
+    def part(self, seconds: float) -> Callable:
+        """on_progress callback for run_ffmpeg, for a process rendering `seconds` of the total."""
+        with self.lock:
+            index = len(self.parts)
+            self.parts[index] = (0.0, 0.0, 0.0)
+
+        def on_progress(out_time: float, fps: float, speed: float):
+            with self.lock:
+                if seconds is not None and out_time >= seconds:
+                    # Finished parts no longer add to the combined fps and speed
+                    self.parts[index] = (seconds, 0.0, 0.0)
+                else:
+                    self.parts[index] = (out_time, fps, speed)
+                self.report()
+
+        return on_progress
+
+    def skip(self, seconds: float):
+        """Count `seconds` of the total as done without encoding (e.g. stream-copied)."""
+        with self.lock:
+            self.parts[len(self.parts)] = (seconds, 0.0, 0.0)
+
+    def report(self, final: bool = False):
+        done = sum(part[0] for part in self.parts.values())
+        now = time.monotonic()
+        if not final and now - self.reported < self.min_interval:
+            return
+        self.reported = now
+
+        elapsed = now - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if final:
+            percent, eta = 100.0, 0.0
+        elif self.total is not None:
+            done = min(done, self.total)
+            percent = 100.0 * done / self.total
+            eta = (self.total - done) / rate if rate > 0 else None
+        else:
+            share = self.fraction() if self.fraction is not None else None
+            percent = 100.0 * share if share is not None else None
+            eta = elapsed * (1 - share) / share if share else None
+        self.callback({
+            "percent": round(percent, 1) if percent is not None else None,
+            "fps": round(sum(part[1] for part in self.parts.values()), 1),
+            # A finished render reports its average speed over the whole run
+            "speed": round(rate if final else sum(part[2] for part in self.parts.values()), 2),
+            "eta": round(eta, 1) if eta is not None else None,
+            "elapsed": round(elapsed, 1)
+        })
+
+    def finish(self):
+        with self.lock:
+            self.report(final=True)
+
+
+def print_progress(info: dict, label: str = ""):
+    """Draw a one-line progress bar on stderr."""
+    width = 30
+    filled = int(width * info["percent"] / 100)
+    eta = info["eta"]
+    eta_text = "--:--" if eta is None else f"{int(eta) // 60:02d}:{int(eta) % 60:02d}"
+    sys.stderr.write(
+        f"\r{label}[{'#' * filled}{' ' * (width - filled)}] {info['percent']:5.1f}% "
+        f"{info['fps']:6.1f} fps {info['speed']:5.2f}x ETA {eta_text}"
+    )
+    if info["percent"] >= 100:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
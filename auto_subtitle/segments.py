@@ -0,0 +1,274 @@
+import os
+import ffmpeg
+import tempfile
+from typing import Callable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from .subtitles import Cues
+from .utils import write_srt
+from .encoding import get_profile, video_args, audio_args, probe_audio_codec
+from .progress import ProgressTracker, run_ffmpeg
+
+
+# Slack (seconds) for cut points computed from the rounded timestamps ffprobe
+# prints, so a cut never lands just after the keyframe it is meant for.
+# Far shorter than a frame.
+CUT_TOLERANCE = 0.001
+
+
+def probe_duration(video_path: str) -> float:
+    """Duration of a media file in seconds."""
+    return float(ffmpeg.probe(video_path)["format"]["duration"])
+
+
+def probe_keyframes(video_path: str) -> List[float]:
+    """
+    Timestamps (in seconds) of the keyframes of the first video stream,
+    relative to the start of the file. Input seeking (-ss) and the segment
+    muxer both count from the container's start_time, which is not 0 for
+    e.g. MPEG-TS, so the absolute frame timestamps are shifted by it. The
+    first keyframe can then be a little after 0, when another stream starts
+    earlier than the video.
+    """
+    probe = ffmpeg.probe(
+        video_path,
+        select_streams="v:0",
+        skip_frame="nokey",
+        show_entries="frame=pts_time,best_effort_timestamp_time:format=start_time"
+    )
+    start_time = probe.get("format", {}).get("start_time")
+    offset = float(start_time) if start_time not in (None, "N/A") else 0.0
+
+    keyframes = []
+    for frame in probe.get("frames", []):
+        timestamp = frame.get("pts_time", frame.get("best_effort_timestamp_time"))
+        if timestamp not in (None, "N/A") and float(timestamp) >= offset:
+            keyframes.append(float(timestamp) - offset)
+    return sorted(set(keyframes))
+
+
+def first_frame(keyframes: List[float], duration: float) -> float:
+    """
+    Where the first range starts: at the first keyframe, since a duration
+    (-t) is counted from the first frame decoded, not from the start of the file.
+    """
+    return keyframes[0] if keyframes and keyframes[0] < duration else 0.0
+
+
+def plan_segments(keyframes: List[float], duration: float, count: int) -> List[tuple]:
+    """
+    Split [first keyframe, duration) into at most `count` (start, end) ranges of similar length.
+    Every boundary falls on a keyframe, so each range can be decoded on its own.
+    """
+    boundaries = [first_frame(keyframes, duration)]
+    for i in range(1, count):
+        target = duration * i / count
+        candidates = [k for k in keyframes if k >= target and k > boundaries[-1]]
+        if candidates and candidates[0] < duration:
+            boundaries.append(candidates[0])
+
+    boundaries.append(duration)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def burn_range(video_path: str, srt_path: Optional[str], out_path: str, start: float, end: float,
+               style: str, profile: dict, threads: int = 0, pix_fmt: Optional[str] = None,
+               on_progress: Optional[Callable] = None):
+    """
+    Burn subtitles into the video stream of [start, end) only, without audio.
+    Ranges without cues (srt_path is None) are encoded as-is.
+    on_progress is passed to progress.run_ffmpeg.
+    """
+    # Input seeking to a keyframe resets timestamps to 0, matching the shifted cue slice.
+    # The duration counts from that keyframe and stops short of the next range.
+    video = ffmpeg.input(video_path, ss=max(0.0, start - CUT_TOLERANCE), t=end - start - CUT_TOLERANCE).video
+    if srt_path is not None:
+        video = video.filter('subtitles', filename=srt_path, force_style=style)
+
+    # Repeat SPS/PPS in-band so the range can be spliced next to pieces
+    # encoded with different settings
+    output_args = {
+        **video_args(profile, threads), "an": None,
+        "x264-params": "repeat-headers=1"
+    }
+    if pix_fmt:
+        output_args["pix_fmt"] = pix_fmt
+    run_ffmpeg(video.output(out_path, **output_args), on_progress)
+
+
+def split_copy(video_path: str, boundaries: List[float], pattern: str, first: float = 0.0):
+    """
+    Split the video stream at the given keyframe times without re-encoding.
+    Writes one file per range to pattern (e.g. "copy%04d.mkv"). The segment
+    muxer cuts on keyframe packets, so no frame ends up in two pieces.
+    It counts from the first video frame, at `first` (see probe_keyframes).
+    Without boundaries the whole video is copied to the first file.
+    """
+    # Put the codec parameters in-band, as burn_range does for its output
+    output_args = {"vcodec": "copy", "an": None, "bsf:v": "h264_mp4toannexb"}
+    if not boundaries:
+        run_ffmpeg(ffmpeg.input(video_path).video.output(pattern % 0, **output_args))
+        return
+
+    times = [max(0.0, t - first - CUT_TOLERANCE) for t in boundaries]
+    run_ffmpeg(ffmpeg.input(video_path).video.output(
+        pattern, **output_args,
+        f="segment", segment_times=",".join(repr(t) for t in times),
+        reset_timestamps=1
+    ))
+
+
+def concat_with_audio(segments: List[tuple], video_path: str, out_path: str, work_dir: str,
+                      profile: dict):
+    """
+    Losslessly join (path, duration) video segments and add the audio of the source.
+    Explicit durations keep every segment at its planned offset, whatever
+    timestamps the segment files report.
+    """
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path, duration in segments:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\nduration {duration!r}\n")
+
+    concatenated = ffmpeg.input(list_path, f="concat", safe=0)
+    audio_codec = probe_audio_codec(video_path)
+    if audio_codec is None:
+        run_ffmpeg(ffmpeg.output(concatenated.video, out_path, vcodec="copy"))
+        return
+
+    source = ffmpeg.input(video_path)
+    run_ffmpeg(ffmpeg.output(
+        concatenated.video, source.audio, out_path,
+        vcodec="copy", **audio_args(profile, audio_codec)
+    ))
+
+
+def render_ranges(video_path: str, cues: Cues, out_path: str, style: str,
+                  ranges: List[tuple], workers: int, profile: dict, pix_fmt: Optional[str] = None,
+                  tracker: Optional[ProgressTracker] = None):
+    """
+    Render consecutive (start, end, reencode) ranges of a video and join them.
+
+    Re-encoded ranges get their own slice of the cues burned in; the others
+    are stream-copied. Every piece carries its codec parameters in-band, so
+    copied and re-encoded pieces can be concatenated without re-encoding. The result
+    is muxed with the audio of the source. Encodes report to `tracker`, copied
+    ranges count as done right away.
+    """
+    # Share the cores between the concurrent encoders, unless the profile fixes a thread count
+    encodes = sum(1 for _, _, reencode in ranges if reencode) or 1
+    threads = profile["threads"] or max(1, (os.cpu_count() or 1) // min(max(1, workers), encodes))
+
+    with tempfile.TemporaryDirectory(prefix="burn_segments_") as work_dir:
+        if not all(reencode for _, _, reencode in ranges):
+            split_copy(video_path, [start for start, _, _ in ranges[1:]],
+                       os.path.join(work_dir, "copy%04d.mkv"), ranges[0][0])
+
+        tasks = []
+        segments = []
+        for i, (start, end, reencode) in enumerate(ranges):
+            if not reencode:
+                segments.append((os.path.join(work_dir, f"copy{i:04d}.mkv"), end - start))
+                if tracker is not None:
+                    tracker.skip(end - start)
+                continue
+
+            cue_slice = cues.slice(start, end)
+            slice_path = None
+            if len(cue_slice):
+                slice_path = os.path.join(work_dir, f"segment{i:04d}.srt")
+                with open(slice_path, "w", encoding="utf-8") as srt:
+                    write_srt(cue_slice, file=srt)
+
+            segment_path = os.path.join(work_dir, f"segment{i:04d}.mkv")
+            segments.append((segment_path, end - start))
+            on_progress = tracker.part(end - start) if tracker is not None else None
+            tasks.append((video_path, slice_path, segment_path, start, end, style, profile, threads, pix_fmt,
+                          on_progress))
+
+        # Each range is its own ffmpeg process; the pool threads only wait on them
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(burn_range, *task) for task in tasks]
+            for future in futures:
+                future.result()
+
+        concat_with_audio(segments, video_path, out_path, work_dir, profile)
+
+
+def burn_segmented(video_path: str, cues: Cues, out_path: str, style: str, parallel: int,
+                   profile: Optional[dict] = None, tracker: Optional[ProgressTracker] = None) -> bool:
+    """
+    Burn subtitles by splitting the video at keyframes and encoding up to `parallel`
+    ranges at once, each with its own slice of the cues. The encoded ranges are then
+    concatenated without re-encoding and muxed with the source audio.
+
+    Returns False (and does nothing) when the video cannot be split, so the caller
+    can fall back to a single encode.
+    """
+    duration = probe_duration(video_path)
+    ranges = plan_segments(probe_keyframes(video_path), duration, parallel)
+    if len(ranges) < 2:
+        return False
+
+    render_ranges(
+        video_path, cues, out_path, style,
+        [(start, end, True) for start, end in ranges], parallel, profile or get_profile(),
+        tracker=tracker
+    )
+    return True
+
+
+def plan_smart_ranges(keyframes: List[float], duration: float, cues: Cues) -> List[tuple]:
+    """
+    Split [first keyframe, duration) at keyframes into (start, end, reencode)
+    ranges, where reencode is True for GOPs that overlap a cue. Neighbouring
+    GOPs with the same flag are merged into one range.
+    """
+    first = first_frame(keyframes, duration)
+    boundaries = [first] + [k for k in keyframes if first < k < duration] + [duration]
+    cue_times = sorted(zip(cues.starts.tolist(), cues.ends.tolist()))
+
+    ranges = []
+    cue_index = 0
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        # Cues are sorted by start, so skip the ones that ended before this GOP
+        while cue_index < len(cue_times) and cue_times[cue_index][1] <= start:
+            cue_index += 1
+        reencode = False
+        for cue_start, cue_end in cue_times[cue_index:]:
+            if cue_start >= end:
+                break
+            if cue_end > start:
+                reencode = True
+                break
+
+        if ranges and ranges[-1][2] == reencode:
+            ranges[-1] = (ranges[-1][0], end, reencode)
+        else:
+            ranges.append((start, end, reencode))
+    return ranges
+
+
+def burn_smart(video_path: str, cues: Cues, out_path: str, style: str, parallel: int = 1,
+               profile: Optional[dict] = None, tracker: Optional[ProgressTracker] = None) -> bool:
+    """
+    Burn subtitles by re-encoding only the GOPs that overlap a cue and copying
+    the rest of the video as-is. Cuts encode time and generation loss for
+    sparsely subtitled videos.
+
+    Only H.264 sources can be spliced with the re-encoded parts; for anything
+    else this returns False (and does nothing) so the caller can fall back to
+    a full encode. Without any cue on the video, it is copied as a whole.
+    """
+    probe = ffmpeg.probe(video_path, select_streams="v:0")
+    streams = probe.get("streams", [])
+    if not streams or streams[0].get("codec_name") != "h264":
+        return False
+
+    duration = float(probe["format"]["duration"])
+    ranges = plan_smart_ranges(probe_keyframes(video_path), duration, cues)
+    render_ranges(
+        video_path, cues, out_path, style, ranges, parallel, profile or get_profile(),
+        pix_fmt=streams[0].get("pix_fmt"), tracker=tracker
+    )
+    return True
@@ -0,0 +1,446 @@
+import time
+import sqlite3
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+from contextlib import contextmanager
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    key TEXT,
+    filename TEXT,
+    download_url TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL NOT NULL,
+    owner TEXT,
+    progress TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_last_access ON outputs (last_access);
+
+CREATE TABLE IF NOT EXISTS sources (
+    source_key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    last_access REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+JOB_FIELDS = (
+    "job_id", "status", "key", "filename", "download_url", "error",
+    "created_at", "started_at", "finished_at", "expires_at", "owner", "progress"
+)
+
+
+class JobStore(ABC):
+    """
+    Registry of jobs and rendered outputs shared by every API worker.
+
+    Jobs map a job_id to its status and output. Outputs are content-addressed
+    files in output_dir, keyed by burn_srt.render_key(), and double as the
+    render cache. output_dir must be visible to every worker that shares the
+    store (a local directory for one node, a network mount for several).
+    Sources map a remote video (its URL and validator) to the SHA-256 of its
+    content, so a download whose render is cached can be skipped.
+
+    Workers identify themselves with worker_id and send heartbeats, so
+    recovery only fails jobs whose owner is gone.
+    """
+
+    def __init__(self, output_dir: Path, max_bytes: int = 0, ttl: float = 24 * 3600,
+                 worker_id: str = "local"):
+        self.output_dir = Path(output_dir)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.worker_id = worker_id
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def output_path(self, key: str, ext: str = ".mp4") -> Path:
+        return self.output_dir / f"{key}{ext}"
+
+    # Jobs
+
+    @abstractmethod
+    def create_job(self, job_id: str, status: str, filename: str, download_url: str,
+                   key: Optional[str] = None, ttl: Optional[float] = None):
+        """Register a job owned by this worker."""
+
+    @abstractmethod
+    def update_job(self, job_id: str, **fields):
+        """Update fields of a job. Unknown jobs are ignored."""
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Return an unexpired job as a dict, or None."""
+
+    # Outputs
+
+    @abstractmethod
+    def get_output(self, key: str) -> Optional[Path]:
+        """Look up a finished render, counting a cache hit or miss."""
+
+    @abstractmethod
+    def has_output(self, key: str) -> bool:
+        """Whether a finished render exists, without counting it as a cache lookup."""
+
+    @abstractmethod
+    def add_output(self, key: str, path: Path):
+        """Register a finished render and enforce the disk budget."""
+
+    @abstractmethod
+    def touch_output(self, key: str):
+        """Mark an output as recently downloaded so the budget evicts it last."""
+
+    @abstractmethod
+    def get_job_output(self, job_id: str) -> Optional[tuple]:
+        """Return (job, path) for a finished, unexpired job whose output still exists."""
+
+    # Sources
+
+    @abstractmethod
+    def get_source_digest(self, source_key: str) -> Optional[str]:
+        """The SHA-256 of a remote video downloaded before, or None."""
+
+    @abstractmethod
+    def add_source_digest(self, source_key: str, digest: str):
+        """Record the SHA-256 of a downloaded remote video."""
+
+    # Maintenance
+
+    @abstractmethod
+    def reap(self) -> tuple:
+        """Remove expired jobs and outputs. Returns (jobs_removed, outputs_removed)."""
+
+    @abstractmethod
+    def heartbeat(self):
+        """Record that this worker is alive."""
+
+    @abstractmethod
+    def live_workers(self, stale_after: float) -> set:
+        """IDs of workers that sent a heartbeat within the last stale_after seconds."""
+
+    @abstractmethod
+    def recover(self, stale_after: float, partial_after: Optional[float] = None):
+        """
+        Fail queued or running jobs whose owner stopped sending heartbeats and
+        remove partial outputs untouched for partial_after (default stale_after) seconds.
+        """
+
+    @abstractmethod
+    def remove_worker(self):
+        """Forget this worker on clean shutdown."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Cache and registry statistics."""
+
+
+class SQLiteJobStore(JobStore):
+    """
+    JobStore backed by a SQLite file. Safe to share between processes on one
+    node (WAL mode, one connection per call), so `uvicorn --workers N` can
+    serve downloads for jobs encoded by any worker. Every call opens its own
+    connection, so the store can be used from the event loop and from encode
+    worker threads alike.
+    """
+
+    def __init__(self, db_path: Path, output_dir: Path, max_bytes: int = 0, ttl: float = 24 * 3600,
+                 worker_id: str = "local"):
+        super().__init__(output_dir, max_bytes, ttl, worker_id)
+        self.db_path = Path(db_path)
+
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # Registries created before jobs had owners or progress
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column in ("owner", "progress"):
+                if column not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            yield db
+        finally:
+            db.close()
+
+    # Jobs
+
+    def create_job(self, job_id: str, status: str, filename: str, download_url: str,
+                   key: Optional[str] = None, ttl: Optional[float] = None):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (job_id, status, key, filename, download_url, created_at, expires_at, owner) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, key, filename, download_url, now, now + (ttl or self.ttl), self.worker_id)
+            )
+
+    def update_job(self, job_id: str, **fields):
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE job_id = ? AND expires_at > ?", (job_id, time.time())
+            ).fetchone()
+        return dict(row) if row else None
+
+    # Outputs
+
+    def get_output(self, key: str) -> Optional[Path]:
+        with self._connect() as db:
+            row = db.execute("SELECT name FROM outputs WHERE key = ?", (key,)).fetchone()
+            path = self.output_dir / row["name"] if row else None
+
+            if path is not None and not path.exists():
+                db.execute("DELETE FROM outputs WHERE key = ?", (key,))
+                path = None
+
+            if path is None:
+                self._increment(db, "misses")
+                return None
+
+            db.execute("UPDATE outputs SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._increment(db, "hits")
+            return path
+
+    def has_output(self, key: str) -> bool:
+        with self._connect() as db:
+            row = db.execute("SELECT name FROM outputs WHERE key = ?", (key,)).fetchone()
+        return row is not None and (self.output_dir / row["name"]).exists()
+
+    def add_output(self, key: str, path: Path):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO outputs (key, name, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, path.name, path.stat().st_size, now, now)
+            )
+        self.enforce_budget()
+
+    def touch_output(self, key: str):
+        with self._connect() as db:
+            db.execute("UPDATE outputs SET last_access = ? WHERE key = ?", (time.time(), key))
+
+    def get_job_output(self, job_id: str) -> Optional[tuple]:
+        job = self.get_job(job_id)
+        if job is None or job["status"] != "done" or not job["key"]:
+            return None
+
+        with self._connect() as db:
+            row = db.execute("SELECT name FROM outputs WHERE key = ?", (job["key"],)).fetchone()
+        if row is None:
+            return None
+
+        path = self.output_dir / row["name"]
+        return (job, path) if path.exists() else None
+
+    # Sources
+
+    def get_source_digest(self, source_key: str) -> Optional[str]:
+        with self._connect() as db:
+            row = db.execute("SELECT digest FROM sources WHERE source_key = ?", (source_key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE sources SET last_access = ? WHERE source_key = ?", (time.time(), source_key))
+            return row["digest"]
+
+    def add_source_digest(self, source_key: str, digest: str):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sources (source_key, digest, last_access) VALUES (?, ?, ?)",
+                (source_key, digest, time.time())
+            )
+
+    # Eviction
+
+    def _delete_outputs(self, db, rows) -> int:
+        removed = 0
+        for row in rows:
+            (self.output_dir / row["name"]).unlink(missing_ok=True)
+            db.execute("DELETE FROM outputs WHERE key = ?", (row["key"],))
+            removed += 1
+        if removed:
+            self._increment(db, "evictions", removed)
+        return removed
+
+    def enforce_budget(self) -> int:
+        """Evict least recently used outputs until the total size fits max_bytes."""
+        if not self.max_bytes:
+            return 0
+
+        with self._connect() as db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM outputs").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+
+            victims = []
+            rows = db.execute(
+                "SELECT key, name, size FROM outputs ORDER BY last_access"
+            ).fetchall()
+            # Never evict the most recently used output
+            for row in rows[:-1]:
+                if total <= self.max_bytes:
+                    break
+                victims.append(row)
+                total -= row["size"]
+
+            return self._delete_outputs(db, victims)
+
+    def reap(self) -> tuple:
+        """
+        Drop expired jobs, then outputs that no live job references and that have
+        not been used for a full TTL, then enforce the disk budget. Sources not
+        used for a full TTL are dropped as well.
+        Returns (jobs_removed, outputs_removed).
+        """
+        now = time.time()
+        with self._connect() as db:
+            jobs_removed = db.execute(
+                "DELETE FROM jobs WHERE expires_at <= ?", (now,)
+            ).rowcount
+            db.execute("DELETE FROM sources WHERE last_access <= ?", (now - self.ttl,))
+
+            expired = db.execute(
+                "SELECT key, name FROM outputs WHERE last_access <= ? "
+                "AND key NOT IN (SELECT key FROM jobs WHERE key IS NOT NULL)",
+                (now - self.ttl,)
+            ).fetchall()
+            outputs_removed = self._delete_outputs(db, expired)
+
+        return jobs_removed, outputs_removed + self.enforce_budget()
+
+    # Workers
+
+    def heartbeat(self):
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO workers (worker_id, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (self.worker_id, time.time())
+            )
+
+    def live_workers(self, stale_after: float) -> set:
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT worker_id FROM workers WHERE heartbeat_at > ?", (time.time() - stale_after,)
+            ).fetchall()
+        return {row["worker_id"] for row in rows}
+
+    def recover(self, stale_after: float, partial_after: Optional[float] = None):
+        """
+        Reconcile the store with the disk, on startup and periodically: jobs
+        that were still queued or running on a worker that is gone are marked
+        failed, and outputs whose files are gone are forgotten.
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.execute("DELETE FROM workers WHERE heartbeat_at <= ?", (now - stale_after,))
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', "
+                "finished_at = ? WHERE status IN ('queued', 'running') "
+                "AND (owner IS NULL OR owner NOT IN (SELECT worker_id FROM workers))",
+                (now,)
+            )
+            for row in db.execute("SELECT key, name FROM outputs").fetchall():
+                if not (self.output_dir / row["name"]).exists():
+                    db.execute("DELETE FROM outputs WHERE key = ?", (row["key"],))
+
+        # Remove encodes that were cut off mid-way. Live encodes keep writing,
+        # so only partial files untouched for longer than partial_after are dropped.
+        partial_after = stale_after if partial_after is None else partial_after
+        for partial in self.output_dir.glob("*.part.*"):
+            try:
+                if partial.stat().st_mtime <= now - partial_after:
+                    partial.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+
+    def remove_worker(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+
+    def _increment(self, db, name: str, amount: int = 1):
+        db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def stats(self) -> dict:
+        with self._connect() as db:
+            entries, size = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outputs"
+            ).fetchone()
+            jobs = db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+
+        return {
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "jobs": jobs,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0)
+        }
+
+
+# Store backends by URL scheme. Each factory gets the part of the URL after
+# "scheme://". A network backend (e.g. Redis or Postgres) can be added by
+# subclassing JobStore and registering it here.
+STORE_BACKENDS = {
+    # sqlite:///relative/path.db or sqlite:////absolute/path.db
+    "sqlite": lambda location, **kwargs: SQLiteJobStore(Path(location[1:]), **kwargs),
+}
+
+
+def open_store(url: str, output_dir: Path, **kwargs) -> JobStore:
+    """
+    Open a JobStore from a URL such as sqlite:////var/lib/subtitles/registry.db.
+    A bare path is treated as a SQLite file.
+    """
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        return SQLiteJobStore(Path(url), output_dir=output_dir, **kwargs)
+
+    if scheme not in STORE_BACKENDS:
+        raise ValueError(f"Unsupported job store: {scheme} (expected one of {', '.join(STORE_BACKENDS)})")
+    return STORE_BACKENDS[scheme](location, output_dir=output_dir, **kwargs)
@@ -0,0 +1,145 @@
+import re
+import html
+import numpy as np
+from typing import Iterable, Iterator, TextIO
+
+
+class SubtitleError(ValueError):
+    """A subtitle file that cannot be parsed or used."""
+
+
+class Cues:
+    """
+    Subtitle cues held as parallel arrays: start and end times in seconds
+    (float64) and the text of each cue. Iterating yields segments
+    ({start, end, text}), the shape utils.write_srt and Whisper results use.
+    """
+
+    def __init__(self, starts, ends, texts):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.texts = list(texts)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[dict]:
+        for start, end, text in zip(self.starts.tolist(), self.ends.tolist(), self.texts):
+            yield {"start": start, "end": end, "text": text}
+
+    def slice(self, start: float, end: float) -> "Cues":
+        """Cues overlapping [start, end), clipped to the range and shifted to start at 0."""
+        indices = np.flatnonzero((self.ends > start) & (self.starts < end))
+        return Cues(
+            np.clip(self.starts[indices], start, end) - start,
+            np.clip(self.ends[indices], start, end) - start,
+            [self.texts[i] for i in indices]
+        )
+
+
+# A cue timing line; hours are optional in WebVTT, which also uses "." for milliseconds
+TIMESTAMP = r"(?:(\d+):)?(\d{1,2}):(\d{1,2})[,.](\d{1,3})"
+TIMING = re.compile(rf"^[ \t]*{TIMESTAMP}[ \t]*-->[ \t]*{TIMESTAMP}[^\n]*$", re.M)
+
+
+# WebVTT markup that SRT renderers do not know: voice, class, language and
+# ruby spans and karaoke timestamps. <b>, <i> and <u> are the same in both.
+VTT_TAGS = re.compile(r"</?(?:v|c|lang|ruby|rt)(?:[.\s][^>]*)?>|<\d[\d:.]*>")
+
+
+def decode_subtitles(data: bytes) -> str:
+    """Subtitle file bytes as text: UTF-8 (with or without BOM), else Windows-1252."""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+
+def timing_seconds(hours, minutes, secs, millis) -> float:
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(secs) + int(millis.ljust(3, "0")) / 1000
+
+
+def vtt_text(text: str) -> str:
+    """WebVTT cue text as SRT cue text: WebVTT-only tags removed and character references decoded."""
+    return html.unescape(VTT_TAGS.sub("", text))
+
+
+def parse_subtitles(text: str) -> Cues:
+    """
+    Parse an SRT or WebVTT document in one pass over the text. Cue numbers,
+    the WEBVTT header, NOTE blocks and cue settings are ignored, and WebVTT
+    cue text is turned into SRT cue text (see vtt_text).
+    As with ffmpeg's SRT reader, every timing line starts a cue, even without
+    a blank line before it, and any other line (even one with "-->") is text.
+    Raises SubtitleError if a non-empty SRT file has no cues at all.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n") + "\n"
+
+    starts, ends, texts = [], [], []
+    timings = list(TIMING.finditer(text))
+    for i, match in enumerate(timings):
+        groups = match.groups()
+        starts.append(timing_seconds(*groups[0:4]))
+        ends.append(timing_seconds(*groups[4:8]))
+
+        # The text runs to the first blank line or the next timing line
+        following = timings[i + 1].start() if i + 1 < len(timings) else len(text)
+        lines = []
+        for line in text[match.end() + 1:following].rstrip("\n").split("\n"):
+            if not line.strip():
+                break
+            lines.append(line)
+        else:
+            # No blank line before the next cue, so its number ends up here
+            if i + 1 < len(timings) and lines and lines[-1].strip().isdigit():
+                lines.pop()
+        texts.append("\n".join(lines).strip())
+
+    webvtt = text.lstrip().startswith("WEBVTT")
+    if not texts and text.strip() and not webvtt:
+        raise SubtitleError("No subtitle cues found")
+    if webvtt:
+        texts = [vtt_text(cue_text) for cue_text in texts]
+
+    return Cues(starts, ends, texts)
+
+
+def normalize(cues: Cues) -> Cues:
+    """
+    Validate cues and put them in the shape every renderer accepts: sorted by
+    start time, without empty or zero-length cues.
+    Raises SubtitleError for cues that end before they start.
+    """
+    backwards = np.flatnonzero(cues.ends < cues.starts)
+    if len(backwards):
+        i = backwards[0]
+        raise SubtitleError(f"Cue {i + 1} ends before it starts ({cues.ends[i]:.3f}s < {cues.starts[i]:.3f}s)")
+
+    keep = [
+        i for i in np.argsort(cues.starts, kind="stable").tolist()
+        if cues.ends[i] > cues.starts[i] and cues.texts[i].strip()
+    ]
+    return Cues(cues.starts[keep], cues.ends[keep], [cues.texts[i].strip() for i in keep])
+
+
+def load_subtitles(path: str) -> Cues:
+    """Read, parse and normalize an SRT or WebVTT file. Raises SubtitleError if it is invalid."""
+    with open(path, "rb") as f:
+        return normalize(parse_subtitles(decode_subtitles(f.read())))
+
+
+def vtt_timestamp(seconds: float) -> str:
+    milliseconds = round(seconds * 1000)
+    return (f"{milliseconds // 3_600_000:02d}:{milliseconds // 60_000 % 60:02d}:"
+            f"{milliseconds // 1000 % 60:02d}.{milliseconds % 1000:03d}")
+
+
+def write_vtt(cues: Iterable[dict], file: TextIO):
+    """Write segments as WebVTT, in a single write."""
+    lines = ["WEBVTT\n\n"]
+    for cue in cues:
+        lines.append(
+            f"{vtt_timestamp(cue['start'])} --> {vtt_timestamp(cue['end'])}\n"
+            f"{cue['text'].strip().replace('-->', '->')}\n\n"
+        )
+    file.write("".join(lines))
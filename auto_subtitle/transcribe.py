@@ -0,0 +1,243 @@
+import os
+import bisect
+import multiprocessing
+import numpy as np
+from typing import Iterator, List
+from concurrent.futures import ProcessPoolExecutor
+from .audio import SAMPLE_RATE
+
+
+# Frames quieter than this (dBFS) count as silence
+SILENCE_DB = -40.0
+# Length of the frames the energy is measured over, in seconds
+FRAME_SECONDS = 0.03
+# Pauses shorter than this stay inside a speech region
+MIN_SILENCE_SECONDS = 0.5
+# Audio kept around each speech region so words are not clipped
+PAD_SECONDS = 0.2
+# Silence put between the regions of a chunk, so Whisper still hears a pause
+GAP_SECONDS = 0.3
+# Bounds on the speech in one chunk; Whisper decodes in 30 s windows
+MIN_CHUNK_SECONDS = 30
+MAX_CHUNK_SECONDS = 300
+# Speech per chunk when streaming, one Whisper window
+STREAM_CHUNK_SECONDS = 30
+# Trailing text of the previous chunk passed as prompt to the next one when streaming
+PROMPT_CHARS = 200
+
+# Model loaded by each worker process (see start_workers)
+_model = None
+
+
+def detect_speech(audio: np.ndarray, sr: int = SAMPLE_RATE, silence_db: float = SILENCE_DB) -> List[tuple]:
+    """
+    Find the (start, end) sample ranges of a mono float32 signal that are
+    louder than silence_db, measured over short frames. Pauses shorter than
+    MIN_SILENCE_SECONDS are bridged and each region is padded by PAD_SECONDS.
+    """
+    frame = int(sr * FRAME_SECONDS)
+    count = len(audio) // frame
+    if count == 0:
+        return []
+
+    frames = np.asarray(audio[:count * frame], dtype=np.float32).reshape(count, frame)
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+    # Rising and falling edges of the loud frames
+    active = np.concatenate(([0], (energy > silence_db).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(active))
+
+    regions = []
+    min_gap = MIN_SILENCE_SECONDS / FRAME_SECONDS
+    for start, end in zip(edges[::2], edges[1::2]):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    pad = int(sr * PAD_SECONDS)
+    padded = []
+    for start, end in regions:
+        start, end = max(0, int(start) * frame - pad), min(len(audio), int(end) * frame + pad)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+
+def split_region(audio: np.ndarray, start: int, end: int, max_samples: int, sr: int = SAMPLE_RATE,
+                 silence_db: float = SILENCE_DB) -> List[tuple]:
+    """
+    Split a speech region into pieces of at most max_samples. Each cut goes at
+    the quietest frame of the second half of the window, if it is quieter than
+    silence_db (e.g. a short pause), and at the end of the window otherwise.
+    """
+    frame = int(sr * FRAME_SECONDS)
+    pieces = []
+    while end - start > max_samples:
+        cut = start + max_samples
+        low = start + max_samples // 2
+        count = (cut - low) // frame
+        if count > 0:
+            frames = np.asarray(audio[low:low + count * frame], dtype=np.float32).reshape(count, frame)
+            energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+            quietest = int(np.argmin(energy))
+            if energy[quietest] < silence_db:
+                cut = low + quietest * frame + frame // 2
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def plan_chunks(audio: np.ndarray, regions: List[tuple], max_samples: int,
+                silence_db: float = SILENCE_DB) -> List[List[tuple]]:
+    """
+    Group consecutive speech regions into chunks of at most max_samples of
+    speech. Longer regions (continuous speech, a music bed) are split first
+    (see split_region), so no chunk is ever longer than max_samples.
+    """
+    chunks = []
+    size = 0
+    pieces = [
+        piece for start, end in regions
+        for piece in split_region(audio, start, end, max_samples, silence_db=silence_db)
+    ]
+    for start, end in pieces:
+        if chunks and size + end - start <= max_samples:
+            chunks[-1].append((start, end))
+            size += end - start
+        else:
+            chunks.append([(start, end)])
+            size = end - start
+    return chunks
+
+
+def build_chunk(audio: np.ndarray, regions: List[tuple], sr: int = SAMPLE_RATE) -> tuple:
+    """
+    Join the speech regions of a chunk, with GAP_SECONDS of silence between
+    them. Returns the samples and the (chunk_time, source_time, duration)
+    pieces needed to map chunk timestamps back onto the source.
+    """
+    gap = np.zeros(int(sr * GAP_SECONDS), dtype=np.float32)
+    parts = []
+    pieces = []
+    position = 0
+    for start, end in regions:
+        if parts:
+            parts.append(gap)
+            position += len(gap)
+        parts.append(np.asarray(audio[start:end], dtype=np.float32))
+        pieces.append((position / sr, start / sr, (end - start) / sr))
+        position += end - start
+    return np.concatenate(parts), pieces
+
+
+def to_source_time(t: float, pieces: List[tuple]) -> float:
+    """Map a timestamp inside a chunk onto the source; times in a gap snap to the region before it."""
+    index = max(0, bisect.bisect_right([chunk_time for chunk_time, _, _ in pieces], t) - 1)
+    chunk_time, source_time, duration = pieces[index]
+    return float(source_time + min(max(t - chunk_time, 0.0), duration))
+
+
+def map_segment(segment: dict, pieces: List[tuple], index: int) -> dict:
+    """A copy of a chunk's segment with its (and its words') times mapped onto the source."""
+    segment = dict(segment, id=index)
+    segment["start"] = to_source_time(segment["start"], pieces)
+    segment["end"] = to_source_time(segment["end"], pieces)
+    if "words" in segment:
+        segment["words"] = [
+            dict(word, start=to_source_time(word["start"], pieces), end=to_source_time(word["end"], pieces))
+            for word in segment["words"]
+        ]
+    return segment
+
+
+def transcribe_stream(transcribe: callable, audio: np.ndarray, silence_db: float = SILENCE_DB,
+                      **decode_options) -> Iterator[dict]:
+    """
+    Yield segments as soon as each window of speech is transcribed, instead of
+    after the whole file. `transcribe(samples, **options)` is a transcribe()
+    like callable (a loaded model's, or the daemon's).
+
+    The audio is cut at silences into windows of at most STREAM_CHUNK_SECONDS
+    of speech; longer stretches without a pause are cut inside. The end of each window's text is passed as initial_prompt to the
+    next, and the language detected in the first window is kept for the rest,
+    so the windows read as one transcription.
+    """
+    regions = detect_speech(audio, silence_db=silence_db)
+    index = 0
+    prompt = decode_options.pop("initial_prompt", None)
+    for chunk in plan_chunks(audio, regions, SAMPLE_RATE * STREAM_CHUNK_SECONDS, silence_db):
+        samples, pieces = build_chunk(audio, chunk)
+        options = dict(decode_options)
+        if prompt:
+            options["initial_prompt"] = prompt
+
+        result = transcribe(samples, **options)
+        decode_options.setdefault("language", result.get("language"))
+        for segment in result["segments"]:
+            yield map_segment(segment, pieces, index)
+            index += 1
+
+        text = "".join(segment["text"] for segment in result["segments"])
+        prompt = (((prompt or "") + text)[-PROMPT_CHARS:]).strip() or prompt
+
+
+def _load_model(model_name: str, threads: int):
+    """Process pool initializer: load one model per worker."""
+    global _model
+    import torch
+    import whisper
+
+    # Split the cores between the workers instead of each one taking all of them
+    torch.set_num_threads(threads)
+    _model = whisper.load_model(model_name)
+
+
+def _transcribe_chunk(audio: np.ndarray, decode_options: dict) -> dict:
+    return _model.transcribe(audio, **decode_options)
+
+
+def start_workers(model_name: str, workers: int) -> ProcessPoolExecutor:
+    """A pool of `workers` processes, each holding its own copy of the model."""
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # torch does not survive fork once it has started threads
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_load_model, initargs=(model_name, threads)
+    )
+
+
+def transcribe_chunked(pool: ProcessPoolExecutor, audio: np.ndarray, workers: int,
+                       silence_db: float = SILENCE_DB, **decode_options) -> dict:
+    """
+    Transcribe a long signal in parallel: split it into chunks at silences,
+    transcribe the chunks in `pool` (see start_workers) and merge the segments
+    back into one timeline. Silent stretches are never sent to the model, and
+    audio without pauses is cut inside (see plan_chunks), so it is spread over
+    the workers too.
+    Returns a dict shaped like the result of whisper's transcribe().
+    """
+    regions = detect_speech(audio, silence_db=silence_db)
+    speech = sum(end - start for start, end in regions)
+
+    # About one chunk per worker, within Whisper-friendly bounds
+    max_samples = int(SAMPLE_RATE * min(MAX_CHUNK_SECONDS, max(MIN_CHUNK_SECONDS, speech / SAMPLE_RATE / workers)))
+    chunks = [build_chunk(audio, chunk) for chunk in plan_chunks(audio, regions, max_samples, silence_db)]
+    futures = [pool.submit(_transcribe_chunk, samples, decode_options) for samples, _ in chunks]
+
+    segments = []
+    language = decode_options.get("language")
+    for future, (_, pieces) in zip(futures, chunks):
+        result = future.result()
+        language = language or result.get("language")
+        for segment in result["segments"]:
+            segments.append(map_segment(segment, pieces, len(segments)))
+
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language
+    }
@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+import numpy as np
+from typing import Optional
+from .utils import json_default
+
+
+# Where transcriptions are kept between runs, and how much disk they may use
+DEFAULT_CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "auto_subtitle"
+)
+DEFAULT_CACHE_SIZE_MB = 512
+
+# Samples hashed at a time, so memory-mapped audio is not read in all at once
+HASH_SAMPLES = 1024 * 1024
+
+
+def transcript_key(audio: np.ndarray, options: dict) -> str:
+    """
+    Cache key of a transcription: the decoded samples plus every option that
+    changes the result (model, task, language, decode and chunking settings).
+    """
+    h = hashlib.sha256()
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    for start in range(0, len(audio), HASH_SAMPLES):
+        h.update(memoryview(audio[start:start + HASH_SAMPLES]).cast("B"))
+    h.update(b"\0")
+    h.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_transcript(cache_dir: str, key: str) -> Optional[dict]:
+    """A cached transcribe() result, or None on a miss. Hits count as recent use."""
+    path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    os.utime(path)
+    return result
+
+
+def save_transcript(cache_dir: str, key: str, result: dict, max_bytes: int):
+    """Store a transcribe() result, then evict the least recently used entries beyond max_bytes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.json")
+
+    # Write under a temporary name so a concurrent run never reads half a file
+    part_path = f"{path}.{os.getpid()}.part"
+    with open(part_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, default=json_default)
+    os.replace(part_path, path)
+
+    evict(cache_dir, max_bytes, keep=path)
+
+
+def evict(cache_dir: str, max_bytes: int, keep: Optional[str] = None):
+    """Remove the least recently used entries until the cache fits in max_bytes (0 for unlimited)."""
+    if not max_bytes:
+        return
+
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".json") and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cached_transcribe(transcribe: callable, cache_dir: str, options: dict, max_bytes: int) -> callable:
+    """
+    Wrap transcribe(audio) so results for the same audio and options are read
+    from cache_dir. Results whose segments are an iterator (streamed) are
+    stored once the iterator is exhausted.
+    """
+    def run(audio):
+        key = transcript_key(audio, options)
+        result = load_transcript(cache_dir, key)
+        if result is not None:
+            print("Using cached transcription.")
+            return result
+
+        result = transcribe(audio)
+        if isinstance(result["segments"], list):
+            save_transcript(cache_dir, key, result, max_bytes)
+            return result
+
+        # Streamed segments are passed on as they come and saved after the last one
+        def stream(segments):
+            done = []
+            for segment in segments:
+                done.append(segment)
+                yield segment
+            save_transcript(cache_dir, key, dict(result, segments=done), max_bytes)
+
+        return dict(result, segments=stream(result["segments"]))
+
+    return run
@@ -30,16 +30,31 @@ def format_timestamp(seconds: float, always_include_hours: bool = False):
     return f"{hours_marker}{minutes:02d}:{seconds:02d},{milliseconds:03d}"
 
 
-def write_srt(transcript: Iterator[dict], file: TextIO):
+def srt_cue(index: int, segment: dict) -> str:
+    """One SRT cue (numbered from 1), with its trailing blank line."""
+    return (
+        f"{index}\n"
+        f"{format_timestamp(segment['start'], always_include_hours=True)} --> "
+        f"{format_timestamp(segment['end'], always_include_hours=True)}\n"
+        f"{segment['text'].strip().replace('-->', '->')}\n\n"
+    )
+
+
+def write_srt(transcript: Iterator[dict], file: TextIO, flush: bool = False):
+    """
+    Write segments as SRT. The file's own buffer collects the cues; with
+    flush=True each cue is flushed as soon as the iterator yields it, so a
+    streamed transcription shows up in the file as it is decoded.
+    """
     for i, segment in enumerate(transcript, start=1):
-        print(
-            f"{i}\n"
-            f"{format_timestamp(segment['start'], always_include_hours=True)} --> "
-            f"{format_timestamp(segment['end'], always_include_hours=True)}\n"
-            f"{segment['text'].strip().replace('-->', '->')}\n",
-            file=file,
-            flush=True,
-        )
+        file.write(srt_cue(i, segment))
+        if flush:
+            file.flush()
+
+
+def json_default(value):
+    """json.dump fallback for NumPy scalars (and anything else, as a string)."""
+    return value.item() if hasattr(value, "item") else str(value)
 
 
 def filename(path):
@@ -0,0 +1,41 @@
+import sys
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from auto_subtitle import transcribe
+from auto_subtitle.audio import SAMPLE_RATE
+
+# Long audio without a single pause (e.g. continuous speech or a music bed)
+# must still be spread over the workers
+seconds = 600
+workers = 4
+
+
+class FakeModel:
+    """Stands in for a Whisper model and records the length of every chunk."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def transcribe(self, audio, **options):
+        self.chunks.append(len(audio) / SAMPLE_RATE)
+        return {"segments": [{"start": 0.0, "end": 1.0, "text": " x"}], "language": "en"}
+
+
+print(f"🎬 Transcribing {seconds} s of continuous signal with {workers} chunk workers...")
+
+t = np.arange(seconds * SAMPLE_RATE) / SAMPLE_RATE
+audio = (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+model = FakeModel()
+transcribe._model = model
+with ThreadPoolExecutor(max_workers=workers) as pool:
+    result = transcribe.transcribe_chunked(pool, audio, workers)
+
+print(f"📦 {len(model.chunks)} chunks, longest {max(model.chunks):.1f} s")
+if len(model.chunks) < workers:
+    print(f"❌ Expected at least {workers} chunks")
+    sys.exit(1)
+if max(model.chunks) > transcribe.MAX_CHUNK_SECONDS:
+    print(f"❌ A chunk is longer than {transcribe.MAX_CHUNK_SECONDS} s")
+    sys.exit(1)
+print("✅ Success!")